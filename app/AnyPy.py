@@ -44,10 +44,16 @@ class AnyPy:
 
         if env.args('any_bvh_file'):
             print("Convert bvh file to anybody interpolation files")
-            from resources.pymo.pymo.parsers import BVHParser as Pymo_BVHParser
+            from resources.pymo.pymo.parsers import parse_file as pymo_parse_file
             any_writer = AnyWriter(template_directory='config/anybody_templates/',
                                    output_directory=os.path.normpath(self.any_path + AnyPy.INTERPOL_DIR) + '/')
-            any_writer.write(Pymo_BVHParser().parse(env.config.any_bvh_file))
+            bvh_data = pymo_parse_file(env.config.any_bvh_file, cache=True)
+            if env.config.any_frame_rate:
+                # only as many frames as the motion needs, faster AnyBody analysis
+                from resources.pymo.pymo.preprocessing import Resampler
+                bvh_data = Resampler(env.config.any_frame_rate).transform([bvh_data])[0]
+                print('Resampled to {} Hz ({} frames)'.format(env.config.any_frame_rate, bvh_data.values.shape[0]))
+            any_writer.write(bvh_data)
 
         if env.args('any_files_dir'):
             self.copy_files()
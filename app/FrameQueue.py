@@ -0,0 +1,107 @@
+import time
+from collections import deque
+from threading import Condition
+
+
+class FrameQueue:
+    """
+    Bounded, blocking hand-off of Leap Motion frames from the listener callback to the converter thread
+
+    Overflow policies when the queue is full:
+    'block'       -> the producer waits until the consumer has taken a frame
+    'drop_oldest' -> the oldest queued frame is discarded to make room
+    'drop_newest' -> the incoming frame is discarded
+    """
+
+    BLOCK = 'block'
+    DROP_OLDEST = 'drop_oldest'
+    DROP_NEWEST = 'drop_newest'
+    POLICIES = (BLOCK, DROP_OLDEST, DROP_NEWEST)
+
+    def __init__(self, maxsize=512, policy=BLOCK):
+        if policy not in FrameQueue.POLICIES:
+            raise ValueError('Choose a correct overflow policy: {}'.format(', '.join(FrameQueue.POLICIES)))
+        if maxsize < 1:
+            raise ValueError('The queue size must be at least 1')
+        self.maxsize = maxsize
+        self.policy = policy
+
+        self._queue = deque()
+        self._condition = Condition()
+        self._closed = False
+
+        # counters
+        self.received = 0
+        self.dropped = 0
+        self.consumed = 0
+        self.max_depth = 0
+        self.lag = 0.0
+        self.max_lag = 0.0
+
+    @property
+    def depth(self):
+        return len(self._queue)
+
+    def put(self, frame):
+        """Add a frame, returns False if a frame (this or the oldest one) had to be dropped"""
+        with self._condition:
+            self.received += 1
+            if self._closed:
+                # i.e. after the converter stopped, the frame is lost
+                self.dropped += 1
+                return False
+            accepted = True
+
+            if len(self._queue) >= self.maxsize:
+                if self.policy == FrameQueue.DROP_NEWEST:
+                    self.dropped += 1
+                    return False
+                if self.policy == FrameQueue.DROP_OLDEST:
+                    self._queue.popleft()
+                    self.dropped += 1
+                    accepted = False
+                else:
+                    while len(self._queue) >= self.maxsize and not self._closed:
+                        self._condition.wait()
+                    if self._closed:
+                        self.dropped += 1
+                        return False
+
+            self._queue.append((time.perf_counter(), frame))
+            self.max_depth = max(self.max_depth, len(self._queue))
+            self._condition.notify_all()
+            return accepted
+
+    def get(self):
+        """Wait for the next frame, returns None when the queue is closed and empty"""
+        with self._condition:
+            while not self._queue and not self._closed:
+                self._condition.wait()
+            if not self._queue:
+                return None
+            queued_time, frame = self._queue.popleft()
+            self.consumed += 1
+            self.lag = time.perf_counter() - queued_time
+            self.max_lag = max(self.max_lag, self.lag)
+            self._condition.notify_all()
+            return frame
+
+    def close(self):
+        """Stop accepting frames, the consumer still receives the frames left in the queue"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def stats(self):
+        return {'depth': self.depth,
+                'max_depth': self.max_depth,
+                'received': self.received,
+                'dropped': self.dropped,
+                'consumed': self.consumed,
+                'lag': self.lag,
+                'max_lag': self.max_lag}
+
+    def __str__(self):
+        return 'frames received: {received}, dropped: {dropped}, converted: {consumed}, ' \
+               'queue depth: {depth} (max {max_depth}), consumer lag: {lag_ms:.1f} ms (max {max_lag_ms:.1f} ms)' \
+            .format(lag_ms=self.lag * 1000, max_lag_ms=self.max_lag * 1000, **self.stats())
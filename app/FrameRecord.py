@@ -0,0 +1,90 @@
+import struct
+import numpy as np
+
+from LeapLoader import Leap
+
+##############
+#  Compact, fixed-layout record of the Leap Motion frame data used by LeapData
+#
+#  Basis matrices are stored like Leap.Matrix.to_array_3x3: one row per basis vector (x_basis, y_basis, z_basis)
+#  Fingers are ordered by FINGER_TYPES, bones by BONE_TYPES
+##############
+
+FINGER_TYPES = (Leap.Finger.TYPE_THUMB, Leap.Finger.TYPE_INDEX, Leap.Finger.TYPE_MIDDLE,
+                Leap.Finger.TYPE_RING, Leap.Finger.TYPE_PINKY)
+BONE_TYPES = (Leap.Bone.TYPE_METACARPAL, Leap.Bone.TYPE_PROXIMAL, Leap.Bone.TYPE_INTERMEDIATE,
+              Leap.Bone.TYPE_DISTAL)
+
+N_FINGERS = len(FINGER_TYPES)
+N_BONES = len(BONE_TYPES)
+
+# little endian, no padding (identical layout to _FRAME_STRUCT)
+FRAME_DTYPE = np.dtype([('id', '<i8'),
+                        ('timestamp', '<i8'),
+                        ('hand_count', 'u1'),
+                        ('is_left', '?'),
+                        ('is_right', '?'),
+                        ('is_valid', '?'),
+                        ('finger_count', 'u1'),
+                        ('hand_basis', '<f4', (3, 3)),
+                        ('arm_basis', '<f4', (3, 3)),
+                        ('elbow_position', '<f4', (3,)),
+                        ('wrist_position', '<f4', (3,)),
+                        ('bone_basis', '<f4', (N_FINGERS, N_BONES, 3, 3)),
+                        ('prev_joint', '<f4', (N_FINGERS, N_BONES, 3)),
+                        ('next_joint', '<f4', (N_FINGERS, N_BONES, 3))])
+
+# records with attribute access (record.timestamp, record.id), like Leap.Frame
+RECORD_DTYPE = np.dtype((np.record, FRAME_DTYPE))
+
+_N_FLOATS = 9 + 9 + 3 + 3 + N_FINGERS * N_BONES * (9 + 3 + 3)
+_FRAME_STRUCT = struct.Struct('<qqB???B{}f'.format(_N_FLOATS))
+_NO_HAND = (0.0, ) * _N_FLOATS
+
+RECORD_SIZE = _FRAME_STRUCT.size
+assert RECORD_SIZE == FRAME_DTYPE.itemsize
+
+
+def pack_frame(frame):
+    """Packs the first hand of a Leap.Frame into a RECORD_SIZE bytes record (single pass over the SWIG objects)"""
+    hands = frame.hands
+    if hands.is_empty:
+        return _FRAME_STRUCT.pack(frame.id, frame.timestamp, 0, False, False, False, 0, *_NO_HAND)
+
+    hand = hands[0]
+    fingers = hand.fingers
+    if fingers.is_empty:
+        return _FRAME_STRUCT.pack(frame.id, frame.timestamp, len(hands), hand.is_left, hand.is_right, hand.is_valid,
+                                  0, *_NO_HAND)
+
+    arm = hand.arm
+    values = hand.basis.to_array_3x3()
+    values += arm.basis.to_array_3x3()
+    values += arm.elbow_position.to_float_array()
+    values += hand.wrist_position.to_float_array()
+
+    # each finger is fetched once, then its bones
+    bones = [finger.bone(bone_type)
+             for finger in [fingers.finger_type(finger_type)[0] for finger_type in FINGER_TYPES]
+             for bone_type in BONE_TYPES]
+    for bone in bones:
+        values += bone.basis.to_array_3x3()
+    for bone in bones:
+        values += bone.prev_joint.to_float_array()
+    for bone in bones:
+        values += bone.next_joint.to_float_array()
+
+    return _FRAME_STRUCT.pack(frame.id, frame.timestamp, len(hands), hand.is_left, hand.is_right, hand.is_valid,
+                              len(fingers), *values)
+
+
+def unpack_frame(data):
+    """Decodes a record from pack_frame without copying, fields are accessible as attributes"""
+    return np.frombuffer(data, dtype=RECORD_DTYPE, count=1)[0]
+
+
+def frame_record(frame):
+    """Returns the record for a Leap.Frame, records are passed through"""
+    if isinstance(frame, np.record):
+        return frame
+    return unpack_frame(pack_frame(frame))
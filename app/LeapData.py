@@ -7,8 +7,10 @@ from config.Skeleton import Skeleton
 from config.AnybodyFirstFrame import AnybodyFirstFrame
 from config.BasisFirstFrame import BasisFirstFrame
 from resources.pymo.pymo.data import MocapData
-from RotationUtil import rot2eul, get_order
-from resources.LeapSDK.v41_python38 import Leap
+from MotionBuffer import MotionBuffer
+from RotationUtil import rots2eul, rots2eul_sequence, mats2quat, quats2mat, slerp, get_order
+from FrameRecord import FINGER_TYPES, BONE_TYPES, N_BONES, frame_record
+from LeapLoader import Leap
 
 
 class LeapData:
@@ -18,11 +20,36 @@ class LeapData:
     Calculates translations (offsets) and rotation data for the joints
     """
 
-    def __init__(self, channel_setting='rotation', frame_rate=0.033333, anybody_basis=True):
+    # how the offset of a joint is measured (see _compile_joint_table)
+    OFFSET_ROOT = 0
+    OFFSET_ELBOW = 1
+    OFFSET_WRIST = 2
+    OFFSET_CARPAL = 3
+    OFFSET_BONE = 4
+
+    # rows of the per frame basis stack [identity, hand, arm, bones...] (see _get_hand_data)
+    BASIS_IDENTITY = 0
+    BASIS_HAND = 1
+    BASIS_ARM = 2
+    BASIS_BONES = 3
+
+    # rows of the per frame point stack [zero, elbow, wrist, prev_joints..., next_joints...]
+    POINT_ZERO = 0
+    POINT_ELBOW = 1
+    POINT_WRIST = 2
+    POINT_PREV_JOINTS = 3
+    POINT_NEXT_JOINTS = POINT_PREV_JOINTS + len(FINGER_TYPES) * N_BONES
+
+    # channel position within the per joint values [Xposition, Yposition, Zposition, Xrotation, ...]
+    CHANNEL_SLOTS = {'Xposition': 0, 'Yposition': 1, 'Zposition': 2,
+                     'Xrotation': 3, 'Yrotation': 4, 'Zrotation': 5}
+
+    def __init__(self, channel_setting='rotation', frame_rate=0.033333, anybody_basis=True, resample=False,
+                 continuous_euler=False):
         self._skeleton = {}
         self._setting = Skeleton(channel_setting)
         self._motion_channels = []
-        self._motions = []
+        self._motions = None
         self._root_name = ''
         self.data = MocapData()
 
@@ -35,6 +62,24 @@ class LeapData:
         self.status = 0
         self._frame_rate = frame_rate
 
+        # resample = True -> interpolate all added frames to a uniform time grid with spacing frame_rate,
+        # rotations with slerp and positions linear
+        # resample = False -> store the values of every added frame at its timestamp
+        self.resample = resample
+        self._grid_step = frame_rate * 1000000
+        self._grid_index = 0
+        # (timestamp, offsets, orientations of the basis joints as quaternions) of the previous frame
+        self._previous = None
+
+        # continuous_euler = True -> the euler solution closest to the previous frame is used and the angles are
+        # unwrapped over all frames (no jumps of 180 / 360 degrees)
+        # continuous_euler = False -> solution with the lowest angles for every single frame
+        self.continuous_euler = continuous_euler
+        # (frame, angles in radians) of the last converted frame and the angles of the last frame before
+        # clear_motion, references to continue the coherent euler angles
+        self._last_euler = None
+        self._euler_reference = None
+
         self._skeleton = self._setting.skeleton
         # fill channels into skeleton in selected order (i.e. xyz)
         self._skeleton_apply_channels(self._setting.channel_setting)
@@ -46,17 +91,139 @@ class LeapData:
             for channel in joint_value['channels']:
                 self._motion_channels.append((joint_name, channel))
 
+        self._compile_joint_table()
+        # one row per frame: orientations of the basis joints as quaternions (n_basis_joints, 4) followed by the
+        # offsets of the position joints (n_position_joints, 3), converted to channel values (euler) on export
+        self._motions = MotionBuffer(4 * self._basis_joints.size + 3 * self._position_joints.size)
+
+        # reference bases (n_joints, 3, 3) of all joints, the AnyBody basis is known from the start,
+        # the Leap Motion first frame basis is stored when the first frame arrives
+        self._initial_bases = self._get_anybody_bases() if self.anybody_basis else None
+
+    def _compile_joint_table(self):
+        """
+        Translate the skeleton once into integer arrays, so that no joint names are parsed per frame
+
+        joint_finger: index into FINGER_TYPES (-1 for root, elbow and hand)
+        joint_bone: index into BONE_TYPES of the bone that defines the basis (-1 if there is none)
+        joint_offset_kind / joint_offset_bone: how (and from which bone) the offset is measured
+        basis_source: row of the joint basis in the per frame basis stack
+        offset_start / offset_end: rows of the points in the per frame point stack, offset = end - start
+        parent_index: index of the parent joint (the root is its own parent)
+        rotated_joints: False for root and finger tips, which have no rotation
+        channel_slots: position of every motion channel in the flattened (n_joints, 6) joint values
+        basis_joints: joints with a Leap Motion basis, their orientation is recorded
+        position_joints: joints with position channels, their offset is recorded
+        """
+        self._joint_names = list(self._skeleton.keys())
+        joint_index = {joint_name: index for index, joint_name in enumerate(self._joint_names)}
+        n_joints = len(self._joint_names)
+
+        self._joint_finger = np.full(n_joints, -1)
+        self._joint_bone = np.full(n_joints, -1)
+        self._joint_offset_kind = np.zeros(n_joints, dtype=int)
+        self._joint_offset_bone = np.full(n_joints, -1)
+
+        for index, joint_name in enumerate(self._joint_names):
+            if joint_name == self._root_name:
+                self._joint_offset_kind[index] = LeapData.OFFSET_ROOT
+                continue
+            if joint_name == 'RightElbow':
+                self._joint_offset_kind[index] = LeapData.OFFSET_ELBOW
+                continue
+            if joint_name == 'RightHand':
+                self._joint_offset_kind[index] = LeapData.OFFSET_WRIST
+                continue
+
+            finger, bone_number = LeapData._split_key(joint_name)
+            self._joint_finger[index] = FINGER_TYPES.index(LeapData._get_finger_type(finger))
+            if '_Nub' not in joint_name:
+                self._joint_bone[index] = BONE_TYPES.index(LeapData._get_bone_type(bone_number))
+
+            # vector between wrist and joint metacarpal proximal (length of carpals)
+            if bone_number == 1 or ('Thumb' in finger and bone_number == 2):
+                self._joint_offset_kind[index] = LeapData.OFFSET_CARPAL
+                self._joint_offset_bone[index] = BONE_TYPES.index(LeapData._get_bone_type(bone_number))
+            # vector for bones metacarpal, proximal, intermediate, distal
+            else:
+                self._joint_offset_kind[index] = LeapData.OFFSET_BONE
+                self._joint_offset_bone[index] = BONE_TYPES.index(LeapData._get_bone_type(bone_number - 1))
+
+        self._parent_index = np.array([joint_index[self._skeleton[joint_name]['parent'] or joint_name]
+                                       for joint_name in self._joint_names])
+        self._rotated_joints = np.array([joint_name != self._root_name and bool(self._skeleton[joint_name]['children'])
+                                         for joint_name in self._joint_names])
+        self._channel_slots = np.array([joint_index[joint_name] * 6 + LeapData.CHANNEL_SLOTS[channel]
+                                        for joint_name, channel in self._motion_channels])
+
+        bone_row = self._joint_finger * N_BONES
+        self._basis_source = np.full(n_joints, LeapData.BASIS_IDENTITY)
+        self._basis_source[self._joint_bone >= 0] = LeapData.BASIS_BONES + (bone_row + self._joint_bone)[self._joint_bone >= 0]
+        self._offset_start = np.full(n_joints, LeapData.POINT_ZERO)
+        self._offset_end = np.full(n_joints, LeapData.POINT_ZERO)
+        for index, offset_kind in enumerate(self._joint_offset_kind):
+            bone = bone_row[index] + self._joint_offset_bone[index]
+            if offset_kind == LeapData.OFFSET_ELBOW:
+                self._basis_source[index] = LeapData.BASIS_ARM
+                self._offset_end[index] = LeapData.POINT_ELBOW
+            elif offset_kind == LeapData.OFFSET_WRIST:
+                self._basis_source[index] = LeapData.BASIS_HAND
+                self._offset_start[index] = LeapData.POINT_ELBOW
+                self._offset_end[index] = LeapData.POINT_WRIST
+            elif offset_kind == LeapData.OFFSET_CARPAL:
+                self._offset_start[index] = LeapData.POINT_WRIST
+                self._offset_end[index] = LeapData.POINT_PREV_JOINTS + bone
+            elif offset_kind == LeapData.OFFSET_BONE:
+                self._offset_start[index] = LeapData.POINT_PREV_JOINTS + bone
+                self._offset_end[index] = LeapData.POINT_NEXT_JOINTS + bone
+
+        self._basis_joints = np.flatnonzero(self._basis_source != LeapData.BASIS_IDENTITY)
+        self._position_joints = np.array([index for index, joint_name in enumerate(self._joint_names)
+                                          if any('position' in channel
+                                                 for channel in self._skeleton[joint_name]['channels'])], dtype=int)
+
     def parse(self):
-        self.data.skeleton = self._skeleton
-        self.data.channel_names = self._motion_channels
-        if not self.first_frame:
+        if self.first_frame is None:
             sys.exit("No data was recorded - will terminate now!")
+        self.data = self.header()
         self.data.values = self._motion2dataframe()
-        self.data.root_name = self._root_name
-        self.data.framerate = self._frame_rate
 
         return self.data
 
+    def header(self):
+        """MocapData with skeleton and channels but without values, the offsets are set by the first frame"""
+        data = MocapData()
+        data.skeleton = self._skeleton
+        data.channel_names = self._motion_channels
+        data.root_name = self._root_name
+        data.framerate = self._frame_rate
+        return data
+
+    @property
+    def frame_count(self):
+        return len(self._motions)
+
+    @property
+    def orientations(self):
+        """View (no copy) of the recorded joint orientations as quaternions (frames, n_basis_joints, 4)"""
+        n_quaternion_values = 4 * self._basis_joints.size
+        return self._motions.values[:, :n_quaternion_values].reshape(len(self._motions), -1, 4)
+
+    def motion_values(self, start=0):
+        """Channel values (frames, channels) of the recorded frames from frame start, in the order of the channels"""
+        return self._channel_values(start)
+
+    def clear_motion(self):
+        """Drops the recorded values (i.e. after streaming them), the first frame stays the time reference"""
+        if self.continuous_euler and len(self._motions):
+            # the angles of the last frame continue the coherent euler angles after the values are dropped
+            last_frame = len(self._motions) - 1
+            if self._last_euler is None or self._last_euler[0] != last_frame:
+                self._channel_values(last_frame)
+            self._euler_reference = self._last_euler[1]
+            self._last_euler = None
+        self._motions.clear()
+
     def _check_frame(self, frame):
         """
         Check whether frame and hand and fingers are valid, produce error when left hand is shown
@@ -66,27 +233,24 @@ class LeapData:
         status_left_hand = 3
         status_valid = 4
 
-        if frame.hands.is_empty:
+        if frame.hand_count == 0:
             if self.status != status_no_hand:
                 print("-- No hand found. --")
                 self.status = status_no_hand
             return False
 
-        # Get the first hand
-        hand = frame.hands[0]
-
-        if hand.is_left:
+        # the record describes the first hand
+        if frame.is_left:
             if self.status != status_left_hand:
                 print("-- Please use your right hand. --")
                 self.status = status_left_hand
             return False
 
-        if not hand.is_right and not hand.is_valid:
+        if not frame.is_right and not frame.is_valid:
             return False
 
         # Check if the hand has any fingers
-        fingers = hand.fingers
-        if fingers.is_empty:
+        if frame.finger_count == 0:
             if self.status != status_no_finger:
                 print("-- No valid fingers found. --")
                 self.status = status_no_finger
@@ -99,126 +263,172 @@ class LeapData:
         return True
 
     def add_frame(self, frame):
+        """Adds a Leap.Frame or a record from FrameRecord, returns the record if it was added"""
+        frame = frame_record(frame)
         if not self._check_frame(frame):
             return None
 
-        # Get the first hand
-        hand = frame.hands[0]
-        if not self.first_frame:
+        if self.first_frame is None:
             self.first_frame = frame
-            channel_values = self._get_channel_values(hand, firstframe=True)
-            self._motions.append((0, channel_values))
+            self._motions.append(0, self._get_first_frame_values(frame))
             return
 
-        channel_values = self._get_channel_values(hand)
-        self._motions.append((frame.timestamp - self.first_frame.timestamp, channel_values))
-        return frame
+        if self.resample:
+            if not self._resample(frame):
+                return None
+            return frame
 
-    def _get_channel_values(self, hand, firstframe=False):
-        channel_values = []
-        # export_basis = {}
-        for joint_name, joint_value in self._skeleton.items():
-            # motion data with rotations
-            if joint_name == self._root_name:
-                x_pos, y_pos, z_pos = LeapData._get_root_offset()
-            elif joint_name == 'RightElbow':
-                x_pos, y_pos, z_pos = LeapData._get_elbow_offset(hand)
-            elif joint_name == 'RightHand':
-                x_pos, y_pos, z_pos = LeapData._get_wrist_offset(hand)
-            else:
-                x_pos, y_pos, z_pos = LeapData._get_finger_offset(joint_name, hand)
+        bases, offsets = self._get_hand_data(frame)
+        self._motions.append(frame.timestamp - self.first_frame.timestamp,
+                             self._motion_rows(self._basis_quaternions(bases), offsets))
+        return frame
 
-            x_rot, y_rot, z_rot = self._calculate_euler_angles(hand, joint_name)
+    def _resample(self, frame):
+        """Appends the values at all grid times up to the frame, interpolated from the previous frame"""
+        timestamp = frame.timestamp - self.first_frame.timestamp
+        previous_timestamp, previous_offsets, previous_quaternions = self._previous
+        if timestamp <= previous_timestamp:
+            return False
 
-            x_rot *= Leap.RAD_TO_DEG
-            y_rot *= Leap.RAD_TO_DEG
-            z_rot *= Leap.RAD_TO_DEG
+        bases, offsets = self._get_hand_data(frame)
+        quaternions = self._basis_quaternions(bases)
+        self._previous = (timestamp, offsets, quaternions)
 
-            # if joint_name == 'RightHand':
-            #     print(x_rot, y_rot, z_rot)
+        # tolerance for grid times which are a multiple of the frame time, but not exactly as float
+        last_index = int(np.floor(timestamp / self._grid_step + 1e-9))
+        grid_times = self._grid_step * np.arange(self._grid_index, last_index + 1)
+        if not grid_times.size:
+            return True
+        self._grid_index += grid_times.size
 
-            if firstframe:
-                if self.anybody_basis:
-                    x_pos, y_pos, z_pos = self._calculate_offset(joint_name, [x_pos, y_pos, z_pos])
-                joint_value['offsets'] = [x_pos, y_pos, z_pos]
+        # all grid times between the previous and this frame and all joints at once
+        weights = np.minimum((grid_times - previous_timestamp) / (timestamp - previous_timestamp), 1.0)
+        grid_offsets = previous_offsets + weights[:, np.newaxis, np.newaxis] * (offsets - previous_offsets)
+        grid_quaternions = slerp(previous_quaternions, quaternions, weights[:, np.newaxis])
 
-                # # dump the basis of leap motion bones
-                # if 'End' not in joint_name and 'Root' not in joint_name:
-                #     export_basis[joint_name] = np.ndarray.tolist(self._get_basis(hand, joint_name))
+        for grid_time, values in zip(grid_times, self._motion_rows(grid_quaternions, grid_offsets)):
+            self._motions.append(grid_time, values)
+        return True
 
-            for channel in joint_value['channels']:
-                if channel == 'Xposition':
-                    channel_values.append((joint_name, channel, x_pos))
-                if channel == 'Yposition':
-                    channel_values.append((joint_name, channel, y_pos))
-                if channel == 'Zposition':
-                    channel_values.append((joint_name, channel, z_pos))
-                if channel == 'Xrotation':
-                    channel_values.append((joint_name, channel, x_rot))
-                if channel == 'Yrotation':
-                    channel_values.append((joint_name, channel, y_rot))
-                if channel == 'Zrotation':
-                    channel_values.append((joint_name, channel, z_rot))
+    def _get_first_frame_values(self, frame):
+        """Sets the reference bases (first frame basis) and the offsets of the skeleton, returns the motion row"""
+        bases, offsets = self._get_hand_data(frame)
+        if not self.anybody_basis:
+            # compare basis to first frame from Leap Motion
+            self._initial_bases = np.ascontiguousarray(bases)
+        quaternions = self._basis_quaternions(bases)
+
+        if self.resample:
+            # first grid point, interpolation starts from the unmodified offsets
+            self._previous = (0, offsets.copy(), quaternions)
+            self._grid_index = 1
+        for joint_index, (joint_name, joint_value) in enumerate(self._skeleton.items()):
+            if self.anybody_basis:
+                offsets[joint_index] = self._calculate_offset(joint_name, offsets[joint_index])
+            joint_value['offsets'] = offsets[joint_index].tolist()
 
         # # dump the basis of leap motion bones
-        # if firstframe:
-        #     import json
-        #     import datetime
-        #     with open('../output/{}basis.json'.format(datetime.datetime.today().strftime('%Y%m%d_%H%M%S')), 'w') as o:
-        #         json.dump(export_basis, o)
+        # import json
+        # import datetime
+        # export_basis = {joint_name: np.ndarray.tolist(bases[joint_index])
+        #                 for joint_index, joint_name in enumerate(self._joint_names)
+        #                 if 'End' not in joint_name and 'Root' not in joint_name}
+        # with open('../output/{}basis.json'.format(datetime.datetime.today().strftime('%Y%m%d_%H%M%S')), 'w') as o:
+        #     json.dump(export_basis, o)
 
-        return channel_values
+        return self._motion_rows(quaternions, offsets)
 
-    def _calculate_euler_angles(self, hand, joint_name):
-        initial_hand = self.first_frame.hands[0]
+    def _basis_quaternions(self, bases):
+        """Orientations of the basis joints (n_basis_joints, 4) for the bases of all joints (n_joints, 3, 3)"""
+        return mats2quat(bases[self._basis_joints])
 
-        # special case for root and finger tip
-        if joint_name == self._root_name or not self._skeleton[joint_name]['children']:
-            return 0.0, 0.0, 0.0
+    def _motion_rows(self, quaternions, offsets):
+        """
+        Packs the orientations of the basis joints (..., n_basis_joints, 4) and the offsets of all joints
+        (..., n_joints, 3) into motion rows: quaternions followed by the offsets of the position joints
+        """
+        shape = quaternions.shape[:-2] + (-1, )
+        return np.concatenate((quaternions.reshape(shape),
+                               offsets[..., self._position_joints, :].reshape(shape)), axis=-1)
 
-        if self.anybody_basis:
-            # compare basis to anybody basis
-            parent_initial_basis = self._get_basis_first_frame(self._skeleton[joint_name]['parent'])
-            initial_basis = self._get_basis_first_frame(joint_name)
+    def _channel_values(self, start=0):
+        """
+        Converts the recorded rows from start to channel values (frames, channels) in the order of the channels,
+        the euler angles (degrees) of all frames and joints are calculated at once
+        """
+        if self.continuous_euler and start and (self._last_euler is None or self._last_euler[0] != start - 1):
+            # the coherent euler angles depend on all previous frames
+            return self._channel_values(0)[start:]
+
+        rows = self._motions.values[start:]
+        n_frames = rows.shape[0]
+        n_joints = len(self._joint_names)
+        n_quaternion_values = 4 * self._basis_joints.size
+
+        bases = np.empty((n_frames, n_joints, 3, 3))
+        bases[:] = np.identity(3)
+        bases[:, self._basis_joints] = quats2mat(rows[:, :n_quaternion_values].reshape(n_frames, -1, 4))
+        positions = np.zeros((n_frames, n_joints, 3))
+        positions[:, self._position_joints] = rows[:, n_quaternion_values:].reshape(n_frames, -1, 3)
+
+        rotations = self._calculate_rotations(bases)
+        if self.continuous_euler:
+            reference = self._euler_reference if not start else self._last_euler[1]
+            euler_angles = self._rotations2euler(rotations, reference)
+            if n_frames:
+                self._last_euler = (start + n_frames - 1, euler_angles[-1])
         else:
-            # compare basis to first frame from Leap Motion
-            parent_initial_basis = self._get_basis(initial_hand, self._skeleton[joint_name]['parent'])
-            initial_basis = self._get_basis(initial_hand, joint_name)
-
-        parent_basis = self._get_basis(hand, self._skeleton[joint_name]['parent'])
-        basis = self._get_basis(hand, joint_name)
+            euler_angles = self._rotations2euler(rotations)
 
-        # if joint_name == 'RightHand':
-        #     print(basis)
+        channel_values = np.concatenate((positions, euler_angles * Leap.RAD_TO_DEG), axis=-1)
+        return channel_values.reshape(n_frames, -1)[:, self._channel_slots]
 
+    def _calculate_rotations(self, bases):
+        """Returns the local rotation matrices of all joints (..., n_joints, 3, 3) for the bases (..., n_joints, 3, 3)"""
         # calculation of local rotation matrix - important!!!
-        rot = np.matmul(
-                np.matmul(
-                    initial_basis, np.transpose(basis)
-                ),
-                np.transpose(
-                    np.matmul(
-                        parent_initial_basis, np.transpose(parent_basis)
-                    )
-                )
-        )
-        return rot2eul(rot)
-
-    def _get_basis(self, hand, joint_name):
-        if joint_name == self._root_name:
-            return np.array([[1, 0, 0],
-                             [0, 1, 0],
-                             [0, 0, 1]])
-        if joint_name == 'RightElbow':
-            return LeapData._basismatrix(hand.arm.basis)
-        if joint_name == 'RightHand':
-            return LeapData._basismatrix(hand.basis)
+        # rot = (initial_basis * basis^T) * (parent_initial_basis * parent_basis^T)^T for all joints at once
+        relative = np.matmul(self._initial_bases, np.swapaxes(bases, -1, -2))
+        return np.matmul(relative, np.swapaxes(relative[..., self._parent_index, :, :], -1, -2))
 
-        # else, return basis of the finger
-        finger, bone_number = LeapData._split_key(joint_name)
-        fingerlist = hand.fingers.finger_type(LeapData._get_finger_type(finger))
-        bone = fingerlist[0].bone(LeapData._get_bone_type(bone_number))
-        return LeapData._basismatrix(bone.basis)
+    def _rotations2euler(self, rotations, reference=None):
+        """
+        Euler angles (radians) of local rotations (frames, n_joints, 3, 3) as array (frames, n_joints, 3),
+        temporally coherent (continuous_euler) from the reference angles (n_joints, 3) before the first frame
+        """
+        if self.continuous_euler:
+            euler_angles = rots2eul_sequence(rotations, reference=reference)
+        else:
+            euler_angles = rots2eul(rotations)
+        # special case for root and finger tip
+        euler_angles[..., ~self._rotated_joints, :] = 0.0
+        return euler_angles
+
+    def _get_hand_data(self, frame):
+        """
+        Looks up all joints in the frame record at once using the joint table
+
+        Returns the bases (n_joints, 3, 3), identity for root and finger tips, and the offsets (n_joints, 3)
+        """
+        basis_stack = np.concatenate((np.identity(3)[np.newaxis],
+                                      frame.hand_basis[np.newaxis],
+                                      frame.arm_basis[np.newaxis],
+                                      frame.bone_basis.reshape(-1, 3, 3))).astype(np.float64)
+        point_stack = np.concatenate((np.zeros((1, 3)),
+                                      frame.elbow_position[np.newaxis],
+                                      frame.wrist_position[np.newaxis],
+                                      frame.prev_joint.reshape(-1, 3),
+                                      frame.next_joint.reshape(-1, 3))).astype(np.float64)
+
+        # basis vectors (rows of the record) are the columns of the basis matrix
+        bases = np.transpose(basis_stack[self._basis_source], (0, 2, 1))
+        offsets = point_stack[self._offset_end] - point_stack[self._offset_start]
+        return bases, offsets
+
+    def _get_anybody_bases(self):
+        """Returns the AnyBody basis of every joint as array (n_joints, 3, 3), identity for root and finger tips"""
+        return np.ascontiguousarray([self._get_basis_first_frame(joint_name) if rotated else np.identity(3)
+                                     for joint_name, rotated in zip(self._joint_names, self._rotated_joints)],
+                                    dtype=float)
 
     def _get_basis_first_frame(self, joint_name):
         if joint_name == self._root_name:
@@ -246,48 +456,9 @@ class LeapData:
             return np.array([0, 0, 0])
         return self.anybody_first_frame.get_position(joint_name)
 
-    @staticmethod
-    def _get_root_offset():
-        return 0, 0, 0
-
-    @staticmethod
-    def _get_elbow_offset(hand):
-        arm = hand.arm
-        return arm.elbow_position.x, arm.elbow_position.y, arm.elbow_position.z
-
-    @staticmethod
-    def _get_wrist_offset(hand):
-        arm = hand.arm
-        x_wrist = hand.wrist_position.x - arm.elbow_position.x
-        y_wrist = hand.wrist_position.y - arm.elbow_position.y
-        z_wrist = hand.wrist_position.z - arm.elbow_position.z
-
-        return x_wrist, y_wrist, z_wrist
-
-    @staticmethod
-    def _get_finger_offset(key, hand):
-        key, bone_number = LeapData._split_key(key)
-
-        fingerlist = hand.fingers.finger_type(LeapData._get_finger_type(key))
-
-        # vector between wrist and joint metacarpal proximal (length of carpals)
-        if bone_number == 1 or ('Thumb' in key and bone_number == 2):
-            bone = fingerlist[0].bone(LeapData._get_bone_type(bone_number))
-            return \
-                bone.prev_joint.x - hand.wrist_position.x, \
-                bone.prev_joint.y - hand.wrist_position.y, \
-                bone.prev_joint.z - hand.wrist_position.z
-
-        # vector for bones metacarpal, proximal, intermediate, distal
-        bone = fingerlist[0].bone(LeapData._get_bone_type(bone_number - 1))
-        return \
-            bone.next_joint.x - bone.prev_joint.x, \
-            bone.next_joint.y - bone.prev_joint.y, \
-            bone.next_joint.z - bone.prev_joint.z
-
     @staticmethod
     def _split_key(key):
-        key_split = re.split('(\d)', key)
+        key_split = re.split(r'(\d)', key)
         key = key_split[0]
         if key_split[-1] == '_Nub':
             return key, 5
@@ -322,12 +493,6 @@ class LeapData:
         else:
             raise Exception('bone number ({}) did not match'.format(bone_number))
 
-    @staticmethod
-    def _basismatrix(basis):
-        return np.array([[basis.x_basis.x, basis.y_basis.x, basis.z_basis.x],
-                        [basis.x_basis.y, basis.y_basis.y, basis.z_basis.y],
-                        [basis.x_basis.z, basis.y_basis.z, basis.z_basis.z]])
-
     def _get_channels(self, joint_name, channel_setting):
         if '_Nub' in joint_name:
             return []
@@ -351,9 +516,8 @@ class LeapData:
     def _motion2dataframe(self):
         """Returns all of the channels parsed from the LeapMotion sensor as a pandas DataFrame"""
 
-        time_index = pandas.to_timedelta([f[0] for f in self._motions], unit='s')
-        frames = [f[1] for f in self._motions]
-        channels = np.asarray([[channel[2] for channel in frame] for frame in frames])
+        time_index = pandas.to_timedelta(self._motions.timestamps, unit='us')
         column_names = ['%s_%s' % (c[0], c[1]) for c in self._motion_channels]
 
-        return pandas.DataFrame(data=channels, index=time_index, columns=column_names)
+        # wrap the converted array without copying it
+        return pandas.DataFrame(data=self._channel_values(), index=time_index, columns=column_names, copy=False)
@@ -3,10 +3,12 @@ from multiprocessing import Process
 import os
 
 import LeapRecord
+import LeapReplay
 from AnyPy import AnyPy
 from config.Configuration import env
 from BVHAnimation import bvh_animation
-from resources.pymo.pymo.parsers import BVHParser as Pymo_BVHParser
+from FrameQueue import FrameQueue
+from resources.pymo.pymo.parsers import parse_file as pymo_parse_file
 from gooey.gui import application
 from gooey.gui import processor
 from gooey.gui.containers import application as containers_application
@@ -106,6 +108,52 @@ class LeapGui:
                                     }
                                     )
 
+        settings_group.add_argument('-buffer_size',
+                                    metavar='Frame buffer',
+                                    help='Maximum number of frames waiting for conversion',
+                                    action='store',
+                                    default=stored_args.get(ACTION_RECORD, 'buffer_size', '512'),
+                                    gooey_options={
+                                        'validator': {
+                                            'test': '1 <= int(user_input)',
+                                            'message': 'Must be greater or equal than 1'
+                                        }
+                                    }
+                                    )
+
+        settings_group.add_argument('-overflow_policy',
+                                    metavar='Buffer overflow',
+                                    help='block: wait for the conversion (no frames lost)\n'
+                                         'drop_oldest: discard the oldest buffered frame\n'
+                                         'drop_newest: discard the incoming frame',
+                                    action='store',
+                                    default=stored_args.get(ACTION_RECORD, 'overflow_policy', FrameQueue.BLOCK),
+                                    widget='Dropdown',
+                                    choices=list(FrameQueue.POLICIES))
+
+        settings_group.add_argument('-gap_free',
+                                    metavar='Gap-free capture',
+                                    help='Recover frames missed between two callbacks from the Leap Motion history',
+                                    action='store_true')
+
+        settings_group.add_argument('-pack_frames',
+                                    metavar='Pack frames',
+                                    help='Store only the required values of each frame in a compact record\n'
+                                         'and release the Leap Motion frame immediately',
+                                    action='store_true')
+
+        settings_group.add_argument('-continuous_euler',
+                                    metavar='Continuous euler angles',
+                                    help='Choose the euler angles closest to the previous frame '
+                                         '(no jumps of 180 degrees)',
+                                    action='store_true')
+
+        settings_group.add_argument('-replay_path',
+                                    metavar='Replay session',
+                                    help='Replay a session file instead of recording with the Leap Motion Controller',
+                                    action='store',
+                                    widget='FileChooser')
+
         settings_group.add_argument('-show_animation',
                                     metavar='Animate',
                                     help='Show motion animation after recording',
@@ -140,6 +188,11 @@ class LeapGui:
                                widget='FileSaver',
                                help='Choose location, where to save the BVH File')
 
+        bvh_group.add_argument('-bvh_stream',
+                               metavar='Stream BVH-File',
+                               help='Write the BVH file while recording instead of after the recording',
+                               action='store_true')
+
         bvh_group.add_argument('channels',
                                metavar='BVH Channels',
                                action='store',
@@ -155,6 +208,42 @@ class LeapGui:
                                    }
                                })
 
+        bvh_group.add_argument('-mocap',
+                               metavar='Write motion file',
+                               help='Write a compressed binary motion file, which loads much faster than a BVH file',
+                               action='store_true')
+
+        bvh_group.add_argument('-mocap_path',
+                               metavar='Motion File',
+                               action='store',
+                               default=stored_args.get(
+                                   ACTION_RECORD, 'mocap_path', LeapGui.StoredArgs.path('../output/BVH/RightHand.mocap')),
+                               widget='FileSaver',
+                               help='Choose location, where to save the motion file')
+
+        # session Group
+        session_group = record_parser.add_argument_group(
+            "Raw Session",
+            gooey_options={
+                'show_border': True,
+                'columns': 1
+            }
+        )
+
+        session_group.add_argument('-session',
+                                   metavar='Write session file',
+                                   help='Stream every received frame to a raw binary session file',
+                                   action='store_true')
+
+        session_group.add_argument('-session_path',
+                                   metavar='Session File',
+                                   action='store',
+                                   default=stored_args.get(
+                                       ACTION_RECORD, 'session_path',
+                                       LeapGui.StoredArgs.path('../output/Session/RightHand.leaprec')),
+                                   widget='FileSaver',
+                                   help='Choose location, where to save the session file')
+
         # interpol Group
         interpol_group = record_parser.add_argument_group(
             "Interpolation Vector",
@@ -282,6 +371,19 @@ class LeapGui:
                                        }
                                    })
 
+        anybody_group.add_argument('-any_frame_rate',
+                                   metavar='Frame rate (Hz)',
+                                   help='Resample the bvh file to this frame rate, with a low-pass filter\n'
+                                        'against aliasing (leave empty for keeping the recorded frames)',
+                                   action='store',
+                                   gooey_options={
+                                       'validator': {
+                                           'test': '0 < float(user_input)',
+                                           'message': 'Must be greater than 0'
+                                       }
+                                   },
+                                   type=float)
+
         operation_group = anybody_parser.add_argument_group(
             "Operations",
             "Select which operations should be executed by AnyBody",
@@ -372,13 +474,13 @@ class LeapGui:
         )
 
         converter_group.add_argument('bvh_file',
-                                     metavar='Source: *.bvh',
+                                     metavar='Source: *.bvh, *.mocap',
                                      action='store',
                                      default=stored_args.get(
                                          ACTION_CONVERTER, 'bvh_file',
                                          LeapGui.StoredArgs.path('../output/BVH/RightHand.bvh')),
                                      widget='FileChooser',
-                                     help='Source bvh-file to convert')
+                                     help='Source bvh-file (or motion file) to convert')
 
         # converter_group.add_argument('-any_file',
         #                              metavar='Convert to .any files',
@@ -470,7 +572,10 @@ class LeapGui:
                 print("Record starting in {} seconds ...".format(countdown-ii))
                 time.sleep(1)
 
-            LeapRecord.start_recording()
+            if env.config.replay_path:
+                LeapRecord.start_replay(LeapReplay.session_frames(env.config.replay_path), realtime=True)
+            else:
+                LeapRecord.start_recording()
 
             gui.end_record()
             print("End of recording\n")
@@ -502,12 +607,12 @@ class LeapGui:
             from AnyWriter import AnyWriter
             any_writer = AnyWriter(template_directory='config/anybody_templates/',
                                    output_directory=env.config.file_dir + '/')
-            any_writer.write(Pymo_BVHParser().parse(env.config.bvh_file))
+            any_writer.write(pymo_parse_file(env.config.bvh_file, cache=True))
             return True
 
         if env.config.command == ACTION_ANIMATION:
             print("Loading the animation ...")
-            bvh_animation.bvh_data = Pymo_BVHParser().parse(env.config.bvh_animation)
+            bvh_animation.bvh_data = pymo_parse_file(env.config.bvh_animation, cache=True)
             bvh_animation.animate()
 
 
@@ -0,0 +1,18 @@
+import sys
+
+##############
+#  Loads the Leap Motion SDK for all modules (from LeapLoader import Leap)
+#
+#  The SDK (LeapPython) is built for Windows, on other platforms (i.e. Linux) LeapReplay stands in and
+#  frames can only be replayed. On Windows a failing import (wrong Python version, missing DLL) is raised.
+##############
+
+try:
+    from resources.LeapSDK.v41_python38 import Leap
+    SDK_AVAILABLE = True
+except ImportError as error:
+    if sys.platform == 'win32':
+        raise
+    print('Leap Motion SDK not available ({}), frames can only be replayed'.format(error))
+    import LeapReplay as Leap
+    SDK_AVAILABLE = False
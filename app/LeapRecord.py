@@ -1,23 +1,34 @@
 import sys
 import os
-from collections import deque
+import time
+import traceback
 from threading import Thread
 
 from config.Configuration import env
-from resources.LeapSDK.v41_python38 import Leap
+from config.Skeleton import Skeleton
+from LeapLoader import Leap, SDK_AVAILABLE
 from LeapData import LeapData
 from resources.pymo.pymo.writers import BVHWriter as Pymo_BVHWriter
+from resources.pymo.pymo.writers import BVHStreamWriter as Pymo_BVHStreamWriter
+from resources.pymo.pymo.writers import MocapFileWriter as Pymo_MocapFileWriter
 # from resources.b3d.bvh_reader import BVH as B3D_BVHReader
 # from resources.b3d.c3d_convertor import Convertor as B3D_C3DWriter
 from AnyWriter import AnyWriter
 from BVHAnimation import bvh_animation
+from FrameQueue import FrameQueue
+from FrameRecord import pack_frame, unpack_frame
+from LeapSession import SessionWriter
+import LeapReplay
 
 # from resources.virb import Virb
 
-_LEAP_QUEUE = deque()
-
 
 class LeapRecord(Leap.Listener):
+    # number of frames kept in the history of the Leap Motion controller
+    HISTORY_SIZE = 60
+    # decimals of the values in the BVH file (positions in mm, angles in degrees)
+    BVH_PRECISION = 6
+
     def __init__(self):
         super(LeapRecord, self).__init__()
         # Initialize Leap2DataFrame parser
@@ -25,7 +36,9 @@ class LeapRecord(Leap.Listener):
         basis_setting = True if env.args('anybody_basis') else False
         self.leap2bvh = LeapData(channel_setting=env.config.channels,
                                  frame_rate=1 / self.fps,
-                                 anybody_basis=basis_setting)
+                                 anybody_basis=basis_setting,
+                                 resample=True,
+                                 continuous_euler=env.config.continuous_euler)
 
         self.bvh_write = env.config.bvh
         if self.bvh_write:
@@ -33,6 +46,11 @@ class LeapRecord(Leap.Listener):
                 os.path.join(os.path.split(env.config.bvh_path)[0],
                              os.path.split(env.config.bvh_path)[1].replace(".bvh", "") + '.bvh'))
 
+        # stream the BVH file while recording, values are only kept if needed after the recording
+        self.bvh_stream = self.bvh_write and env.config.bvh_stream
+        self.bvh_stream_writer = None
+        self.streamed_frames = 0
+
         # self.c3d_write = env.config.c3d
         # if self.c3d_write:
         #     self.c3d_filename = env.config.c3d_path + '\\' + env.config.c3d_filename + '.c3d'
@@ -42,9 +60,38 @@ class LeapRecord(Leap.Listener):
             self.anybody_template_path = env.config.anybody_template_path + '\\'
             self.anybody_output_path = env.config.anybody_output_path + '\\'
 
-        self.processing = True
+        # compressed binary motion file (skeleton, channels and values), BVH can be written from it on demand
+        self.mocap_write = env.config.mocap
+        if self.mocap_write:
+            self.mocap_filename = os.path.normpath(env.config.mocap_path)
+
+        self.keep_motion = not self.bvh_stream or self.anybody_write or self.mocap_write or env.config.show_animation
+
+        # bounded hand-off between on_frame and the converter thread
+        self.frame_queue = FrameQueue(maxsize=int(env.config.buffer_size or 512),
+                                      policy=env.config.overflow_policy or FrameQueue.BLOCK)
+
+        # pack frames into compact byte records in the callback, decoding happens in the converter thread
+        self.pack_frames = env.config.pack_frames
+
+        # raw session file with every received frame record
+        self.session = None
+        if env.config.session:
+            self.session = SessionWriter(os.path.normpath(env.config.session_path),
+                                         skeleton=Skeleton(env.config.channels).skeleton,
+                                         metadata={'frames_per_second': self.fps,
+                                                   'channels': env.config.channels,
+                                                   'anybody_basis': basis_setting})
+
+        # gap-free capture: fetch frames missed between two callbacks from the controller history
+        self.gap_free = env.config.gap_free
+        self.last_frame_id = None
+        self.frames_recovered = 0
+        self.frames_lost = 0
+
         self.t = None
-        self.last_time = 0
+        # exception that stopped the converter thread
+        self.error = None
 
         # self.garmin = Virb(host=('192.168.137.34', 80))
 
@@ -68,40 +115,123 @@ class LeapRecord(Leap.Listener):
         # self.garmin.stop_recording()
 
     def on_frame(self, controller):
+        if self.gap_free:
+            for frame in self.history_frames(controller):
+                self.queue_frame(frame)
+            return
+
         # Get the most recent frame
         frame = controller.frame()
-        _LEAP_QUEUE.append(frame)
+        self.queue_frame(frame)
         # self.leap2bvh.add_frame(controller.frame())
 
+    def queue_frame(self, frame):
+        # the packed record does not hold on to the SWIG frame
+        self.frame_queue.put(pack_frame(frame) if self.pack_frames else frame)
+
+    def history_frames(self, controller):
+        """Returns all frames since the last processed frame (oldest first), counts frames no longer in the history"""
+        frames = []
+        for history in range(LeapRecord.HISTORY_SIZE):
+            frame = controller.frame(history)
+            if not frame.is_valid or (self.last_frame_id is not None and frame.id <= self.last_frame_id):
+                break
+            frames.append(frame)
+            if self.last_frame_id is None:
+                # first callback, start with the most recent frame
+                break
+
+        if not frames:
+            return frames
+
+        frames.reverse()
+        if self.last_frame_id is not None:
+            self.frames_recovered += len(frames) - 1
+            self.frames_lost += frames[0].id - self.last_frame_id - 1
+        self.last_frame_id = frames[-1].id
+        return frames
+
     @staticmethod
     def process_frame(listener):
-        while listener.processing:
-            try:
-                while True:
-                    frame = _LEAP_QUEUE.popleft()
-                    if frame.timestamp - listener.last_time > int(1000000 / listener.fps):
-                        added_frame = listener.leap2bvh.add_frame(frame)
-                        if added_frame:
-                            # print(added_frame.timestamp - listener.last_time)
-                            listener.last_time = added_frame.timestamp
-            except IndexError:
-                pass
+        try:
+            # blocks until a frame arrives, returns None after the queue was closed and drained
+            frame = listener.frame_queue.get()
+            while frame is not None:
+                if listener.session:
+                    data = frame if listener.pack_frames else pack_frame(frame)
+                    frame = unpack_frame(data)
+                    listener.session.write(data, frame.timestamp)
+                elif listener.pack_frames:
+                    frame = unpack_frame(frame)
+                # every frame is passed on, LeapData resamples them to the frames per second
+                listener.leap2bvh.add_frame(frame)
+                if listener.bvh_stream:
+                    listener.stream_bvh()
+                frame = listener.frame_queue.get()
+        except Exception as error:
+            listener.error = error
+            traceback.print_exc()
+        finally:
+            # no more frames are converted, release the callback if it waits for room in the queue
+            listener.frame_queue.close()
+
+    def stream_bvh(self):
+        """Passes new motion values to the BVH stream, the hierarchy is written once the offsets are known"""
+        if self.leap2bvh.frame_count == self.streamed_frames:
+            return
+        if self.bvh_stream_writer is None:
+            self.bvh_stream_writer = Pymo_BVHStreamWriter(open(self.bvh_filename, 'w'),
+                                                          precision=LeapRecord.BVH_PRECISION)
+            self.bvh_stream_writer.write_header(self.leap2bvh.header())
+
+        self.bvh_stream_writer.write_frames(self.leap2bvh.motion_values(self.streamed_frames))
+        if self.keep_motion:
+            self.streamed_frames = self.leap2bvh.frame_count
+        else:
+            self.leap2bvh.clear_motion()
+            self.streamed_frames = 0
 
     def exit(self):
-        self.processing = False
-        self.t.join()
+        self.stop()
         self.exit_actions()
 
+    def stop(self):
+        # convert the remaining frames and stop the converter thread
+        self.frame_queue.close()
+        self.t.join()
+        print(self.frame_queue)
+        if self.error:
+            print('frame conversion stopped after an error: {!r}'.format(self.error))
+        if self.gap_free:
+            print('frames recovered from history: {}, lost (not in history anymore): {}'
+                  .format(self.frames_recovered, self.frames_lost))
+        if self.session:
+            self.session.close()
+            print('"{}" written ({} frames)'.format(self.session.filename, self.session.count))
+        if self.bvh_stream_writer:
+            self.bvh_stream_writer.close()
+            print('"{}" written ({} frames)'.format(self.bvh_filename, self.bvh_stream_writer.frames))
+
     def exit_actions(self):
+        if not self.keep_motion:
+            # the motion was streamed to the BVH file, nothing left to export
+            return
+
         bvh_data = self.leap2bvh.parse()
 
-        if self.bvh_write:
-            bvh_writer = Pymo_BVHWriter()
+        if self.bvh_write and not self.bvh_stream:
+            bvh_writer = Pymo_BVHWriter(precision=LeapRecord.BVH_PRECISION)
             bvh_file = open(self.bvh_filename, 'w')
             bvh_writer.write(bvh_data, bvh_file)
             bvh_file.close()
             print('"{}" written'.format(bvh_file.name))
 
+        if self.mocap_write:
+            Pymo_MocapFileWriter(compression='zlib').write(bvh_data, self.mocap_filename,
+                                                           metadata={'frames_per_second': self.fps,
+                                                                     'channels': env.config.channels})
+            print('"{}" written'.format(self.mocap_filename))
+
         # if self.c3d_write:
         #     # workaround, need bvh
         #     bvh_writer = Pymo_BVHWriter()
@@ -131,6 +261,9 @@ class LeapRecord(Leap.Listener):
 
 
 def start_recording():
+    if not SDK_AVAILABLE:
+        raise RuntimeError('Recording needs the Leap Motion SDK, without it sessions can only be replayed')
+
     # Create a listener and controller
     listener = LeapRecord()
     controller = Leap.Controller()
@@ -149,3 +282,26 @@ def start_recording():
         controller.remove_listener(listener)
         print("Listener removed")
         listener.exit()
+
+
+def start_replay(frames, realtime=False):
+    """Replays frames (see LeapReplay) through the recording pipeline instead of the Leap Motion Controller"""
+    listener = LeapRecord()
+    controller = LeapReplay.ReplayController(frames, realtime=realtime)
+
+    start_time = time.perf_counter()
+    controller.add_listener(listener)
+    print("Listener added")
+    try:
+        controller.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        controller.remove_listener(listener)
+        print("Listener removed")
+        listener.stop()
+        elapsed = time.perf_counter() - start_time
+        print(controller)
+        print('processed {} frames in {:.2f} s ({:.1f} frames/s)'.format(
+            listener.frame_queue.consumed, elapsed, listener.frame_queue.consumed / elapsed))
+        listener.exit_actions()
@@ -0,0 +1,325 @@
+import math
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+##############
+#  Pure Python stand-in for the parts of the Leap Motion SDK (Leap.py / LeapPython) used by this application
+#
+#  Frames are replayed from a session file (see LeapSession) or generated (synthetic_frames) and delivered
+#  to a Leap.Listener by ReplayController, so recording and conversion also run without device and SDK (i.e. Linux)
+##############
+
+PI = math.pi
+DEG_TO_RAD = math.pi / 180
+RAD_TO_DEG = 180 / math.pi
+EPSILON = 1.1920928955078125e-07
+
+
+class Vector:
+    def __init__(self, x=0.0, y=0.0, z=0.0):
+        self.x = x
+        self.y = y
+        self.z = z
+
+    def to_float_array(self):
+        return [self.x, self.y, self.z]
+
+    def to_tuple(self):
+        return self.x, self.y, self.z
+
+    def __repr__(self):
+        return '({}, {}, {})'.format(self.x, self.y, self.z)
+
+
+class Matrix:
+    """Basis with one row per basis vector (x_basis, y_basis, z_basis) and origin, like Leap.Matrix"""
+
+    def __init__(self, rows=((1.0, 0.0, 0.0), (0.0, 1.0, 0.0), (0.0, 0.0, 1.0)), origin=None):
+        self._rows = [float(value) for row in rows for value in row]
+        self.origin = origin if origin else Vector()
+
+    @property
+    def x_basis(self):
+        return Vector(*self._rows[0:3])
+
+    @property
+    def y_basis(self):
+        return Vector(*self._rows[3:6])
+
+    @property
+    def z_basis(self):
+        return Vector(*self._rows[6:9])
+
+    def to_array_3x3(self):
+        return list(self._rows)
+
+
+class Bone:
+    TYPE_METACARPAL = 0
+    TYPE_PROXIMAL = 1
+    TYPE_INTERMEDIATE = 2
+    TYPE_DISTAL = 3
+
+    def __init__(self, bone_type, basis, prev_joint, next_joint):
+        self.type = bone_type
+        self.basis = basis
+        self.prev_joint = prev_joint
+        self.next_joint = next_joint
+        self.is_valid = True
+
+
+class Finger:
+    TYPE_THUMB = 0
+    TYPE_INDEX = 1
+    TYPE_MIDDLE = 2
+    TYPE_RING = 3
+    TYPE_PINKY = 4
+
+    def __init__(self, finger_type, bones):
+        self.type = finger_type
+        self._bones = bones
+        self.is_valid = True
+
+    def bone(self, bone_type):
+        return self._bones[bone_type]
+
+
+class FingerList(list):
+    @property
+    def is_empty(self):
+        return not self
+
+    def finger_type(self, finger_type):
+        return FingerList(finger for finger in self if finger.type == finger_type)
+
+
+class Arm:
+    def __init__(self, basis, elbow_position, wrist_position):
+        self.basis = basis
+        self.elbow_position = elbow_position
+        self.wrist_position = wrist_position
+        self.is_valid = True
+
+
+class Hand:
+    def __init__(self, basis, arm, wrist_position, fingers, is_left=False, is_valid=True):
+        self.basis = basis
+        self.arm = arm
+        self.wrist_position = wrist_position
+        self.fingers = FingerList(fingers)
+        self.is_left = is_left
+        self.is_right = not is_left
+        self.is_valid = is_valid
+
+
+class HandList(list):
+    @property
+    def is_empty(self):
+        return not self
+
+
+class Frame:
+    def __init__(self, frame_id=0, timestamp=0, hands=(), is_valid=True):
+        self.id = frame_id
+        self.timestamp = timestamp
+        self.hands = HandList(hands)
+        self.is_valid = is_valid
+
+    @staticmethod
+    def invalid():
+        return Frame(is_valid=False)
+
+    @staticmethod
+    def from_record(record):
+        """Builds a frame from a record of FrameRecord (i.e. from a session file)"""
+        if not record.hand_count:
+            return Frame(int(record.id), int(record.timestamp))
+
+        fingers = []
+        if record.finger_count:
+            for finger_type in range(len(record.bone_basis)):
+                fingers.append(Finger(finger_type, [
+                    Bone(bone_type,
+                         Matrix(record.bone_basis[finger_type, bone_type].tolist()),
+                         Vector(*record.prev_joint[finger_type, bone_type].tolist()),
+                         Vector(*record.next_joint[finger_type, bone_type].tolist()))
+                    for bone_type in range(len(record.bone_basis[finger_type]))]))
+
+        wrist_position = Vector(*record.wrist_position.tolist())
+        arm = Arm(Matrix(record.arm_basis.tolist()), Vector(*record.elbow_position.tolist()), wrist_position)
+        hand = Hand(Matrix(record.hand_basis.tolist()), arm, wrist_position, fingers,
+                    is_left=bool(record.is_left), is_valid=bool(record.is_valid))
+        # only the first hand is recorded, further hands are counted
+        return Frame(int(record.id), int(record.timestamp), [hand] * int(record.hand_count))
+
+
+class Listener:
+    def on_init(self, controller):
+        pass
+
+    def on_connect(self, controller):
+        pass
+
+    def on_disconnect(self, controller):
+        pass
+
+    def on_exit(self, controller):
+        pass
+
+    def on_frame(self, controller):
+        pass
+
+
+class ReplayController:
+    """
+    Delivers frames to a Listener like Leap.Controller
+
+    realtime=True keeps the time deltas between the frame timestamps, otherwise frames are replayed as fast as
+    the listener accepts them (load test of the recording pipeline)
+    """
+
+    HISTORY_SIZE = 60
+
+    def __init__(self, frames, realtime=False):
+        self._frames = frames
+        self.realtime = realtime
+        self.is_connected = False
+        self.frames_replayed = 0
+        self.elapsed = 0.0
+        self._history = deque(maxlen=ReplayController.HISTORY_SIZE)
+        self._listener = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def frame(self, history=0):
+        if history < len(self._history):
+            return self._history[history]
+        return Frame.invalid()
+
+    def add_listener(self, listener):
+        self._listener = listener
+        listener.on_init(self)
+        self._thread = threading.Thread(target=self._replay)
+        self._thread.start()
+        return True
+
+    def remove_listener(self, listener):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        listener.on_exit(self)
+        self._listener = None
+        return True
+
+    def wait(self, timeout=None):
+        """Blocks until all frames were replayed"""
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+    @property
+    def frame_rate(self):
+        return self.frames_replayed / self.elapsed if self.elapsed else 0.0
+
+    def _replay(self):
+        self.is_connected = True
+        self._listener.on_connect(self)
+
+        start_time = time.perf_counter()
+        first_timestamp = None
+        for frame in self._frames:
+            if self._stop.is_set():
+                break
+            if self.realtime:
+                if first_timestamp is None:
+                    first_timestamp = frame.timestamp
+                delay = (frame.timestamp - first_timestamp) / 1000000 - (time.perf_counter() - start_time)
+                if delay > 0:
+                    time.sleep(delay)
+            self._history.appendleft(frame)
+            self._listener.on_frame(self)
+            self.frames_replayed += 1
+        self.elapsed = time.perf_counter() - start_time
+
+        self.is_connected = False
+        self._listener.on_disconnect(self)
+
+    def __str__(self):
+        return 'replayed {} frames in {:.2f} s ({:.1f} frames/s)'.format(
+            self.frames_replayed, self.elapsed, self.frame_rate)
+
+
+Controller = ReplayController
+
+
+def session_frames(filename):
+    """Frames of a session file (see LeapSession), read lazily from the memory-mapped records"""
+    from LeapSession import SessionReader
+    session = SessionReader(filename)
+    for record in session.records:
+        yield Frame.from_record(record)
+
+
+def _rotation_x(angle):
+    c, s = math.cos(angle), math.sin(angle)
+    return np.array([[1.0, 0.0, 0.0], [0.0, c, -s], [0.0, s, c]])
+
+
+def _rotation_y(angle):
+    c, s = math.cos(angle), math.sin(angle)
+    return np.array([[c, 0.0, s], [0.0, 1.0, 0.0], [-s, 0.0, c]])
+
+
+def _basis(rotation):
+    # columns of the rotation are the basis vectors, Matrix expects rows
+    return Matrix(rotation.T.tolist())
+
+
+# right hand, pointing to -z with the palm facing down (mm): knuckle position and bone lengths for each finger
+_FINGERS = ((Finger.TYPE_THUMB, (-20.0, -10.0, -10.0), (0.0, 45.0, 30.0, 25.0), 0.6),
+            (Finger.TYPE_INDEX, (-22.0, 0.0, -65.0), (65.0, 40.0, 23.0, 18.0), 0.1),
+            (Finger.TYPE_MIDDLE, (-3.0, 0.0, -68.0), (62.0, 45.0, 27.0, 19.0), 0.0),
+            (Finger.TYPE_RING, (14.0, 0.0, -63.0), (57.0, 42.0, 26.0, 19.0), -0.1),
+            (Finger.TYPE_PINKY, (29.0, -3.0, -55.0), (52.0, 33.0, 19.0, 17.0), -0.2))
+_FOREARM_LENGTH = 250.0
+
+
+def synthetic_frame(frame_id, timestamp):
+    """Right hand with a slowly rotating forearm, waving wrist and periodically flexing fingers"""
+    t = timestamp / 1000000
+
+    arm_rotation = _rotation_y(0.3 * math.sin(0.5 * t)) @ _rotation_x(0.2 * math.sin(0.3 * t))
+    hand_rotation = arm_rotation @ _rotation_x(0.4 * math.sin(1.1 * t))
+    wrist = np.array([0.0, 200.0, 0.0]) + 20.0 * np.array([math.sin(0.7 * t), math.sin(0.4 * t), 0.0])
+    elbow = wrist + arm_rotation @ np.array([0.0, 0.0, _FOREARM_LENGTH])
+
+    fingers = []
+    for finger_type, knuckle, lengths, splay in _FINGERS:
+        flexion = 0.5 * (1 - math.cos(2.0 * t + 0.3 * finger_type))
+        rotation = hand_rotation @ _rotation_y(splay)
+        knuckle_position = wrist + hand_rotation @ np.array(knuckle)
+        # metacarpals lead from the wrist to the knuckles, the thumb metacarpal has zero length
+        prev_joint = wrist + hand_rotation @ np.array([knuckle[0] * 0.4, knuckle[1], 0.0]) \
+            if lengths[Bone.TYPE_METACARPAL] else knuckle_position
+        bones = []
+        for bone_type, length in enumerate(lengths):
+            if bone_type == Bone.TYPE_METACARPAL:
+                next_joint = knuckle_position
+            else:
+                rotation = rotation @ _rotation_x(-flexion * (0.9 if bone_type == Bone.TYPE_PROXIMAL else 0.7))
+                next_joint = prev_joint + rotation @ np.array([0.0, 0.0, -length])
+            bones.append(Bone(bone_type, _basis(rotation), Vector(*prev_joint.tolist()), Vector(*next_joint.tolist())))
+            prev_joint = next_joint
+        fingers.append(Finger(finger_type, bones))
+
+    wrist_position = Vector(*wrist.tolist())
+    arm = Arm(_basis(arm_rotation), Vector(*elbow.tolist()), wrist_position)
+    return Frame(frame_id, timestamp, [Hand(_basis(hand_rotation), arm, wrist_position, fingers)])
+
+
+def synthetic_frames(n_frames, frames_per_second=120):
+    """Generated hand motion with n_frames frames at the given device frame rate"""
+    return [synthetic_frame(frame_id, int(frame_id * 1000000 / frames_per_second))
+            for frame_id in range(1, n_frames + 1)]
@@ -0,0 +1,153 @@
+import datetime
+import json
+import mmap
+import os
+import struct
+
+import numpy as np
+
+from FrameRecord import FRAME_DTYPE, RECORD_DTYPE, RECORD_SIZE, FINGER_TYPES, BONE_TYPES
+
+##############
+#  Raw Leap Motion session file
+#
+#  | magic (8) | header length (u8) | JSON header, padded to 64 bytes |
+#  | N fixed-size records (FrameRecord.FRAME_DTYPE) |
+#  | index: (timestamp, record number) every INDEX_STRIDE records (i8, i8) |
+#  | trailer: magic (8) | record count (u8) | index offset (u8) | index entries (u8) |
+#
+#  The records can be opened with numpy.memmap, every field (i.e. records['timestamp']) is a column view.
+#  The index and trailer are written on close, without them (i.e. after a crash) the number of records is
+#  derived from the file size.
+##############
+
+SESSION_MAGIC = b'LEAPSESS'
+INDEX_MAGIC = b'LEAPIDX\x00'
+SESSION_VERSION = 1
+INDEX_STRIDE = 256
+
+_SIZE_STRUCT = struct.Struct('<Q')
+_TRAILER_STRUCT = struct.Struct('<8sQQQ')
+_ALIGNMENT = 64
+
+
+class SessionWriter:
+    """Streams packed frame records (see FrameRecord.pack_frame) to a raw session file"""
+
+    def __init__(self, filename, skeleton=None, metadata=None):
+        self.filename = filename
+        self.count = 0
+        self._index = []
+        self._file = open(filename, 'wb')
+
+        header = {'version': SESSION_VERSION,
+                  'created': datetime.datetime.today().strftime('%Y-%m-%d %H:%M:%S'),
+                  'record_size': RECORD_SIZE,
+                  'record_fields': [[name] + [str(FRAME_DTYPE[name].base), list(FRAME_DTYPE[name].shape)]
+                                    for name in FRAME_DTYPE.names],
+                  'finger_types': list(FINGER_TYPES),
+                  'bone_types': list(BONE_TYPES),
+                  'skeleton': {joint_name: joint_value['parent'] for joint_name, joint_value in skeleton.items()}
+                  if skeleton else {},
+                  'index_stride': INDEX_STRIDE,
+                  'metadata': metadata or {}}
+        header_bytes = json.dumps(header).encode('utf-8')
+        prefix_size = len(SESSION_MAGIC) + _SIZE_STRUCT.size
+        header_bytes += b' ' * (-(prefix_size + len(header_bytes)) % _ALIGNMENT)
+
+        self._file.write(SESSION_MAGIC)
+        self._file.write(_SIZE_STRUCT.pack(len(header_bytes)))
+        self._file.write(header_bytes)
+
+    def write(self, data, timestamp):
+        """Appends one packed record (bytes) with its timestamp (used for the index)"""
+        if self.count % INDEX_STRIDE == 0:
+            self._index.append((timestamp, self.count))
+        self._file.write(data)
+        self.count += 1
+
+    def close(self):
+        if self._file.closed:
+            return
+        index_offset = self._file.tell()
+        self._file.write(np.array(self._index, dtype='<i8').reshape(-1, 2).tobytes())
+        self._file.write(_TRAILER_STRUCT.pack(INDEX_MAGIC, self.count, index_offset, len(self._index)))
+        self._file.close()
+
+
+class SessionReader:
+    """
+    Opens a raw session file without loading it, the records are memory-mapped
+
+    session.records[1000:2000] or session.records['timestamp'] only read the accessed parts of the file
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        file_size = os.path.getsize(filename)
+
+        with open(filename, 'rb') as f:
+            if f.read(len(SESSION_MAGIC)) != SESSION_MAGIC:
+                raise ValueError('"{}" is not a Leap Motion session file'.format(filename))
+            header_size, = _SIZE_STRUCT.unpack(f.read(_SIZE_STRUCT.size))
+            self.header = json.loads(f.read(header_size).decode('utf-8'))
+            self.data_offset = f.tell()
+
+            f.seek(max(file_size - _TRAILER_STRUCT.size, 0))
+            magic, count, index_offset, index_entries = _TRAILER_STRUCT.unpack(f.read(_TRAILER_STRUCT.size))
+
+        if self.header['record_size'] != RECORD_SIZE:
+            raise ValueError('"{}" uses a different record layout'.format(filename))
+
+        self.complete = magic == INDEX_MAGIC
+        if not self.complete:
+            # recording was not closed properly, use all complete records
+            count = (file_size - self.data_offset) // RECORD_SIZE
+
+        self.skeleton = self.header['skeleton']
+        self.metadata = self.header['metadata']
+        # records and index are read-only views of the mapping
+        with open(filename, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.records = np.frombuffer(self._mmap, dtype=RECORD_DTYPE, count=count, offset=self.data_offset)
+
+        if self.complete and index_entries:
+            self.index = np.frombuffer(self._mmap, dtype='<i8', count=index_entries * 2,
+                                       offset=index_offset).reshape(index_entries, 2)
+        else:
+            stride = self.header['index_stride']
+            self.index = np.column_stack((self.records['timestamp'][::stride], np.arange(0, count, stride)))
+
+    def __len__(self):
+        return self.records.shape[0]
+
+    def __getitem__(self, item):
+        return self.records[item]
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def time_slice(self, start=None, end=None):
+        """Returns the slice of records between start and end (seconds since the first record)"""
+        if not len(self):
+            return slice(0, 0)
+        first_timestamp = self.index[0, 0]
+        start_record = 0 if start is None else self._find_record(first_timestamp + int(start * 1e6))
+        end_record = len(self) if end is None else self._find_record(first_timestamp + int(end * 1e6))
+        return slice(start_record, end_record)
+
+    def _find_record(self, timestamp):
+        # narrow down with the sparse index, then search only inside one block of records
+        block = max(int(np.searchsorted(self.index[:, 0], timestamp, side='right')) - 1, 0)
+        block_start = int(self.index[block, 1])
+        block_end = int(self.index[block + 1, 1]) if block + 1 < self.index.shape[0] else len(self)
+        return block_start + int(np.searchsorted(self.records['timestamp'][block_start:block_end], timestamp))
+
+    def close(self):
+        """Releases the mapping, records taken from the reader (i.e. slices) keep it open until they are deleted"""
+        self.records = np.empty(0, dtype=RECORD_DTYPE)
+        self.index = np.empty((0, 2), dtype='<i8')
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass
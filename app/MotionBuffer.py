@@ -0,0 +1,55 @@
+import numpy as np
+
+
+class MotionBuffer:
+    """
+    Growable columnar storage for recorded motion data
+
+    Keeps one float row per frame (frames, channels) and a timestamp per frame in preallocated arrays,
+    the capacity is doubled when the buffer is full (amortized constant time per frame)
+    """
+
+    def __init__(self, n_channels, capacity=1024, dtype=np.float64):
+        self.n_channels = n_channels
+        self._length = 0
+        self._values = np.empty((max(capacity, 1), n_channels), dtype=dtype)
+        self._timestamps = np.empty(max(capacity, 1), dtype=np.float64)
+
+    def __len__(self):
+        return self._length
+
+    @property
+    def capacity(self):
+        return self._timestamps.shape[0]
+
+    @property
+    def values(self):
+        """View (no copy) of the recorded values (frames, channels)"""
+        return self._values[:self._length]
+
+    @property
+    def timestamps(self):
+        """View (no copy) of the recorded timestamps (frames,)"""
+        return self._timestamps[:self._length]
+
+    def append(self, timestamp, values):
+        if self._length == self.capacity:
+            self._grow(2 * self.capacity)
+        self._values[self._length] = values
+        self._timestamps[self._length] = timestamp
+        self._length += 1
+
+    def clear(self):
+        self._length = 0
+
+    def _grow(self, capacity):
+        values = np.empty((capacity, self.n_channels), dtype=self._values.dtype)
+        values[:self._length] = self._values[:self._length]
+        timestamps = np.empty(capacity, dtype=np.float64)
+        timestamps[:self._length] = self._timestamps[:self._length]
+        self._values = values
+        self._timestamps = timestamps
+
+    @property
+    def nbytes(self):
+        return self._values.nbytes + self._timestamps.nbytes
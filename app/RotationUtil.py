@@ -1,7 +1,16 @@
 import numpy as np
 import math
 
-from resources.LeapSDK.v41_python38 import Leap
+from LeapLoader import Leap
+
+
+# i, j, k, n of all rotation orders (see get_order)
+ROTATION_ORDERS = {'XYZ': (0, 1, 2, False),
+                   'XZY': (0, 2, 1, True),
+                   'YXZ': (1, 0, 2, True),
+                   'YZX': (1, 2, 0, False),
+                   'ZXY': (2, 0, 1, False),
+                   'ZYX': (2, 1, 0, True)}
 
 
 def get_order():
@@ -149,7 +158,7 @@ def vec2quat(v1, v2):
         return q
 
     if dot_p > 1 - Leap.EPSILON:
-        return np.array([0, 0, 0, 1])
+        return np.array([1.0, 0.0, 0.0, 0.0])
 
     tmpvec3 = np.cross(a, b)
     q = np.append(1 + dot_p, tmpvec3)
@@ -174,8 +183,8 @@ def rot2quat(rotmat):
         q[1] = 0.25 * s
         s = 1.0 / s
         q[0] = (rotmat[1, 2] - rotmat[2, 1]) * s
-        q[2] = (rotmat[1, 0] - rotmat[0, 1]) * s
-        q[3] = (rotmat[2, 0] - rotmat[0, 2]) * s
+        q[2] = (rotmat[1, 0] + rotmat[0, 1]) * s
+        q[3] = (rotmat[2, 0] + rotmat[0, 2]) * s
         return normalize_quat(q)
 
     if rotmat[1, 1] > rotmat[2, 2]:
@@ -183,16 +192,16 @@ def rot2quat(rotmat):
         q[2] = 0.25 * s
         s = 1.0 / s
         q[0] = (rotmat[2, 0] - rotmat[0, 2]) * s
-        q[1] = (rotmat[1, 0] - rotmat[0, 1]) * s
-        q[3] = (rotmat[2, 1] - rotmat[1, 2]) * s
+        q[1] = (rotmat[1, 0] + rotmat[0, 1]) * s
+        q[3] = (rotmat[2, 1] + rotmat[1, 2]) * s
         return normalize_quat(q)
 
     s = 2.0 * np.sqrt(1.0 + rotmat[2, 2] - rotmat[0, 0] - rotmat[1, 1])
     q[3] = 0.25 * s
     s = 1.0 / s
     q[0] = (rotmat[0, 1] - rotmat[1, 0]) * s
-    q[1] = (rotmat[2, 0] - rotmat[0, 2]) * s
-    q[2] = (rotmat[2, 1] - rotmat[1, 2]) * s
+    q[1] = (rotmat[2, 0] + rotmat[0, 2]) * s
+    q[2] = (rotmat[2, 1] + rotmat[1, 2]) * s
     return normalize_quat(q)
 
 
@@ -209,7 +218,7 @@ def normalize_quat(q):
 def conjugate_quat(q):
     q[1] = -q[1]
     q[2] = -q[2]
-    q[3] = -q[4]
+    q[3] = -q[3]
     return q
 
 
@@ -237,6 +246,262 @@ def rot2eul(rotmat):
     return euler[0], euler[1], euler[2]
 
 
+def _order_indices(order=None):
+    """Returns i, j, k, parity for an order name (see ROTATION_ORDERS), an order list like get_order() or None (get_order)"""
+    if order is None:
+        order = get_order()
+    elif isinstance(order, str):
+        order = ROTATION_ORDERS[order.upper()]
+    return int(order[2]), int(order[1]), int(order[0]), order[3]
+
+
+def _rots2eul_solutions(rotmats, order=None):
+    """Both euler solutions (..., 3) of the rotation matrices (..., 3, 3), identical under gimbal lock"""
+    i, j, k, parity = _order_indices(order)
+
+    rotmats = np.asarray(rotmats, dtype=float)
+    eul1 = np.zeros(rotmats.shape[:-1])
+    eul2 = np.zeros(rotmats.shape[:-1])
+
+    cy = np.hypot(rotmats[..., i, i], rotmats[..., i, j])
+    regular = cy > Leap.EPSILON
+
+    eul1[..., i] = np.where(regular,
+                            np.arctan2(rotmats[..., j, k], rotmats[..., k, k]),
+                            np.arctan2(-rotmats[..., k, j], rotmats[..., j, j]))
+    eul1[..., j] = np.arctan2(-rotmats[..., i, k], cy)
+    eul1[..., k] = np.where(regular, np.arctan2(rotmats[..., i, j], rotmats[..., i, i]), 0.0)
+
+    eul2[..., i] = np.arctan2(-rotmats[..., j, k], -rotmats[..., k, k])
+    eul2[..., j] = np.arctan2(-rotmats[..., i, k], -cy)
+    eul2[..., k] = np.arctan2(-rotmats[..., i, j], -rotmats[..., i, i])
+    # gimbal lock: only one solution
+    eul2 = np.where(regular[..., np.newaxis], eul2, eul1)
+
+    #  parity of axis permutation (even=False, odd=True)
+    if not parity:
+        eul1 = np.negative(eul1)
+        eul2 = np.negative(eul2)
+    return eul1, eul2
+
+
+def rots2eul(rotmats, order=None):
+    """
+    Array version of _rot2eul: converts rotation matrices (..., 3, 3) to euler angles (..., 3)
+
+    Branches are selected with masks, so that the results match _rot2eul for every single matrix
+    """
+    eul1, eul2 = _rots2eul_solutions(rotmats, order)
+
+    # return best, which is just the one with lowest values in it
+    use_eul2 = np.sum(np.absolute(eul1), axis=-1) > np.sum(np.absolute(eul2), axis=-1)
+    return np.where(use_eul2[..., np.newaxis], eul2, eul1)
+
+
+def _angle_distance(eul1, eul2):
+    """Sum of the absolute differences of the angles (..., 3), wrapped to [-pi, pi]"""
+    return np.sum(np.absolute(np.angle(np.exp(1j * (eul1 - eul2)))), axis=-1)
+
+
+def rots2eul_sequence(rotmats, order=None, reference=None):
+    """
+    Temporally coherent version of rots2eul for a sequence of rotation matrices (frames, ..., 3, 3)
+
+    For every frame the solution closest to the previous frame is used and the angles are unwrapped over the frames,
+    so there are no jumps of 180 or 360 degrees. The first frame is chosen like rots2eul or, if given, closest to
+    the reference angles (..., 3) of the frame before the sequence (i.e. the last frame of a previous chunk)
+    """
+    eul1, eul2 = _rots2eul_solutions(rotmats, order)
+    if not eul1.shape[0]:
+        return eul1
+
+    # the second solution is a fixed isometric mapping of the first one (angles modulo 2 pi), so the solution
+    # switches between two frames exactly if the other solution is closer to the first solution of the previous frame
+    switch = _angle_distance(eul2[1:], eul1[:-1]) < _angle_distance(eul1[1:], eul1[:-1])
+    if reference is None:
+        first = np.sum(np.absolute(eul1[0]), axis=-1) > np.sum(np.absolute(eul2[0]), axis=-1)
+    else:
+        first = _angle_distance(eul2[0], reference) < _angle_distance(eul1[0], reference)
+    use_eul2 = np.cumsum(np.concatenate((first[np.newaxis], switch)), axis=0) % 2 == 1
+    euler = np.where(use_eul2[..., np.newaxis], eul2, eul1)
+
+    if reference is None:
+        return np.unwrap(euler, axis=0)
+    # continue from the (possibly unwrapped) reference angles
+    return np.unwrap(np.concatenate((np.asarray(reference, dtype=float)[np.newaxis], euler)), axis=0)[1:]
+
+
+def euls2rot(euls, order=None):
+    """Converts euler angles (..., 3) to rotation matrices (..., 3, 3), inverse of rots2eul / _rot2eul"""
+    i, j, k, parity = _order_indices(order)
+
+    euls = np.asarray(euls, dtype=float)
+    ti, tj, th = euls[..., i], euls[..., j], euls[..., k]
+    if not parity:
+        ti, tj, th = -ti, -tj, -th
+
+    ci, cj, ch = np.cos(ti), np.cos(tj), np.cos(th)
+    si, sj, sh = np.sin(ti), np.sin(tj), np.sin(th)
+    cc, cs, sc, ss = ci * ch, ci * sh, si * ch, si * sh
+
+    rotmats = np.empty(euls.shape[:-1] + (3, 3))
+    rotmats[..., i, i] = cj * ch
+    rotmats[..., j, i] = sj * sc - cs
+    rotmats[..., k, i] = sj * cc + ss
+    rotmats[..., i, j] = cj * sh
+    rotmats[..., j, j] = sj * ss + cc
+    rotmats[..., k, j] = sj * cs - sc
+    rotmats[..., i, k] = -sj
+    rotmats[..., j, k] = cj * si
+    rotmats[..., k, k] = cj * ci
+    return rotmats
+
+
+def rots2quat(rotmats):
+    """
+    Array version of rot2quat: converts rotation matrices (..., 3, 3) to quaternions (..., 4)
+
+    Like rot2quat this is the conjugate of mats2quat (w >= 0), use mats2quat for the inverse of quats2mat
+    """
+    return conjugate_quats(mats2quat(rotmats))
+
+
+def normalize_quats(q):
+    """Array version of normalize_quat, zero quaternions become (0, 1, 0, 0)"""
+    q = np.asarray(q, dtype=float)
+    scal = np.linalg.norm(q, axis=-1, keepdims=True)
+    zero = scal == 0.0
+    return np.where(zero, np.array([0.0, 1.0, 0.0, 0.0]), q / np.where(zero, 1.0, scal))
+
+
+def conjugate_quats(q):
+    """Array version of conjugate_quat (returns a new array)"""
+    return np.asarray(q, dtype=float) * np.array([1.0, -1.0, -1.0, -1.0])
+
+
+def multiply_quats(q1, q2):
+    """Array version of multiply_quat for quaternions (..., 4), the inputs are broadcast"""
+    q1 = np.asarray(q1, dtype=float)
+    q2 = np.asarray(q2, dtype=float)
+    w1, x1, y1, z1 = q1[..., 0], q1[..., 1], q1[..., 2], q1[..., 3]
+    w2, x2, y2, z2 = q2[..., 0], q2[..., 1], q2[..., 2], q2[..., 3]
+    return np.stack((w1 * w2 - x1 * x2 - y1 * y2 - z1 * z2,
+                     w1 * x2 + x1 * w2 + y1 * z2 - z1 * y2,
+                     w1 * y2 + y1 * w2 + z1 * x2 - x1 * z2,
+                     w1 * z2 + z1 * w2 + x1 * y2 - y1 * x2), axis=-1)
+
+
+def vecs2quat(v1, v2):
+    """Array version of vec2quat: quaternions (..., 4) rotating the vectors v1 (..., 3) onto v2 (..., 3)"""
+    a = np.asarray(v1, dtype=float)
+    b = np.asarray(v2, dtype=float)
+    a = a / np.linalg.norm(a, axis=-1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=-1, keepdims=True)
+    a, b = np.broadcast_arrays(a, b)
+
+    dot_p = np.sum(a * b, axis=-1)
+    q = np.concatenate(((1 + dot_p)[..., np.newaxis], np.cross(a, b)), axis=-1)
+
+    # opposite vectors: half turn around any axis perpendicular to v1
+    opposite = dot_p < -1 + Leap.EPSILON
+    if np.any(opposite):
+        axis = np.cross(np.array([1.0, 0.0, 0.0]), a)
+        axis = np.where(np.linalg.norm(axis, axis=-1, keepdims=True) < Leap.EPSILON,
+                        np.cross(np.array([0.0, 1.0, 0.0]), a), axis)
+        axis = axis / np.linalg.norm(axis, axis=-1, keepdims=True)
+        t = np.pi * 0.5
+        half_turn = np.concatenate((np.full(dot_p.shape + (1, ), np.cos(t)), axis * np.sin(t)), axis=-1)
+        q = np.where(opposite[..., np.newaxis], half_turn, q)
+
+    # parallel vectors: no rotation
+    parallel = (dot_p > 1 - Leap.EPSILON) & ~opposite
+    q = np.where(parallel[..., np.newaxis], np.array([1.0, 0.0, 0.0, 0.0]), q)
+    return q / np.linalg.norm(q, axis=-1, keepdims=True)
+
+
+def vecs2eul(v1, v2, order=None):
+    """Array version of vec2eul, returns the euler angles as array (..., 3)"""
+    return rots2eul(quats2mat(vecs2quat(v1, v2)), order)
+
+
+def _quat_k(m):
+    # symmetric matrix 4 * q q^T of the quaternion of the rotation matrix m, diagonal = 4 * (w², x², y², z²)
+    return np.array([[1 + m[0, 0] + m[1, 1] + m[2, 2], m[2, 1] - m[1, 2], m[0, 2] - m[2, 0], m[1, 0] - m[0, 1]],
+                     [m[2, 1] - m[1, 2], 1 + m[0, 0] - m[1, 1] - m[2, 2], m[1, 0] + m[0, 1], m[0, 2] + m[2, 0]],
+                     [m[0, 2] - m[2, 0], m[1, 0] + m[0, 1], 1 - m[0, 0] + m[1, 1] - m[2, 2], m[2, 1] + m[1, 2]],
+                     [m[1, 0] - m[0, 1], m[0, 2] + m[2, 0], m[2, 1] + m[1, 2], 1 - m[0, 0] - m[1, 1] + m[2, 2]]])
+
+
+# _quat_k is affine in the matrix elements, mats2quat evaluates it for all matrices with one product
+_QUAT_K_CONSTANT = _quat_k(np.zeros((3, 3))).reshape(16)
+_QUAT_K_COEFFICIENTS = np.stack([_quat_k(unit.reshape(3, 3)).reshape(16) - _QUAT_K_CONSTANT
+                                 for unit in np.eye(9)], axis=0)
+
+
+def mats2quat(rotmats):
+    """
+    Converts rotation matrices (..., 3, 3) to unit quaternions (..., 4) as (w, x, y, z)
+
+    Inverse of quats2mat / quat2mat (rot2quat returns the conjugate), w >= 0
+    """
+    rotmats = np.asarray(rotmats, dtype=float)
+    shape = rotmats.shape[:-2]
+    k = (rotmats.reshape(-1, 9) @ _QUAT_K_COEFFICIENTS + _QUAT_K_CONSTANT).reshape(-1, 4, 4)
+
+    # the row of the largest component avoids divisions by small values
+    largest = np.argmax(k[:, (0, 1, 2, 3), (0, 1, 2, 3)], axis=-1)
+    q = k[np.arange(k.shape[0]), largest]
+
+    q /= np.sqrt(np.einsum('...i,...i->...', q, q))[:, np.newaxis]
+    q[q[:, 0] < 0] *= -1
+    return q.reshape(shape + (4, ))
+
+
+def quats2mat(quats):
+    """Array version of quat2mat: converts quaternions (..., 4) as (w, x, y, z) to rotation matrices (..., 3, 3)"""
+    q = math.sqrt(2) * np.asarray(quats, dtype=float)
+    q0, q1, q2, q3 = q[..., 0], q[..., 1], q[..., 2], q[..., 3]
+
+    mat = np.empty(q.shape[:-1] + (3, 3))
+    mat[..., 0, 0] = 1.0 - q2 * q2 - q3 * q3
+    mat[..., 1, 0] = q0 * q3 + q1 * q2
+    mat[..., 2, 0] = -q0 * q2 + q1 * q3
+
+    mat[..., 0, 1] = -q0 * q3 + q1 * q2
+    mat[..., 1, 1] = 1.0 - q1 * q1 - q3 * q3
+    mat[..., 2, 1] = q0 * q1 + q2 * q3
+
+    mat[..., 0, 2] = q0 * q2 + q1 * q3
+    mat[..., 1, 2] = -q0 * q1 + q2 * q3
+    mat[..., 2, 2] = 1.0 - q1 * q1 - q2 * q2
+    return mat
+
+
+def slerp(q0, q1, t):
+    """
+    Spherical linear interpolation between unit quaternions q0 and q1 (..., 4) at t (broadcast against q0[..., 0])
+
+    Interpolates along the shorter arc, nearly identical quaternions are interpolated linearly
+    """
+    q0 = np.asarray(q0, dtype=float)
+    q1 = np.asarray(q1, dtype=float)
+    t = np.asarray(t, dtype=float)[..., np.newaxis]
+
+    dot = np.sum(q0 * q1, axis=-1, keepdims=True)
+    q1 = np.where(dot < 0, -q1, q1)
+    dot = np.minimum(np.absolute(dot), 1.0)
+
+    theta = np.arccos(dot)
+    sin_theta = np.sin(theta)
+    small = sin_theta < Leap.EPSILON
+    safe_sin = np.where(small, 1.0, sin_theta)
+    w0 = np.where(small, 1.0 - t, np.sin((1.0 - t) * theta) / safe_sin)
+    w1 = np.where(small, t, np.sin(t * theta) / safe_sin)
+
+    q = w0 * q0 + w1 * q1
+    return q / np.linalg.norm(q, axis=-1, keepdims=True)
+
+
 def quat_diff(q_prev, q_next):
     q_prev = conjugate_quat(q_prev)
     q_prev = np.kron(q_prev, 1.0 / np.dot(q_prev, q_prev))
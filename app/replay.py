@@ -0,0 +1,53 @@
+import argparse
+
+import LeapRecord
+import LeapReplay
+from config.Configuration import env
+from FrameQueue import FrameQueue
+
+
+def parse_args():
+    """Command line version of the Record settings, runs without the Gooey GUI and the Leap Motion SDK"""
+    parser = argparse.ArgumentParser(description='Replay a session file or a generated hand motion through the '
+                                                 'Leap Motion recording and conversion')
+    env.add_parser(parser)
+    parser.add_argument('replay_path', nargs='?', default=None,
+                        help='Session file, a generated hand motion is replayed if omitted')
+    parser.add_argument('-replay_frames', type=int, default=1200,
+                        help='Number of generated frames')
+    parser.add_argument('-replay_fps', type=float, default=120,
+                        help='Frame rate of the generated frames')
+    parser.add_argument('-realtime', action='store_true',
+                        help='Replay with the original frame rate instead of as fast as possible')
+
+    parser.add_argument('-frames_per_second', default='30')
+    parser.add_argument('-buffer_size', default='512')
+    parser.add_argument('-overflow_policy', default=FrameQueue.BLOCK, choices=list(FrameQueue.POLICIES))
+    parser.add_argument('-gap_free', action='store_true')
+    parser.add_argument('-pack_frames', action='store_true')
+    parser.add_argument('-anybody_basis', action='store_true')
+    parser.add_argument('-firstframe_basis', action='store_true')
+    parser.add_argument('-channels', default='rotation', choices=['rotation', 'position'])
+    parser.add_argument('-bvh', action='store_true')
+    parser.add_argument('-bvh_path', default='../output/BVH/RightHand.bvh')
+    parser.add_argument('-bvh_stream', action='store_true')
+    parser.add_argument('-continuous_euler', action='store_true')
+    parser.add_argument('-session', action='store_true')
+    parser.add_argument('-session_path', default='../output/Session/RightHand.leaprec')
+    parser.add_argument('-mocap', action='store_true')
+    parser.add_argument('-mocap_path', default='../output/BVH/RightHand.mocap')
+    parser.set_defaults(anybody=False, show_animation=False)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.replay_path:
+        frames = LeapReplay.session_frames(args.replay_path)
+    else:
+        frames = LeapReplay.synthetic_frames(args.replay_frames, args.replay_fps)
+    LeapRecord.start_replay(frames, realtime=args.realtime)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,14 @@
 import numpy as np
 
+# binary motion file of MocapData (see writers.MocapFileWriter and parsers.MocapFileParser):
+# | magic (8) | header length (u8) | JSON header, padded to 64 bytes | time index (frames) int64 ns | values (frames, columns) |
+# the JSON header holds skeleton, channel names, framerate, columns, value type and the sizes of both arrays,
+# which are stored raw (the values can be memory-mapped) or zlib compressed
+MOCAP_MAGIC = b'PYMOCAP\x00'
+MOCAP_VERSION = 1
+MOCAP_SUFFIX = '.mocap'
+MOCAP_ALIGNMENT = 64
+
 class Joint():
     def __init__(self, name, parent=None, children=None):
         self.name = name
@@ -7,9 +7,20 @@ Created: June 12, 2017
 Based on: https://gist.github.com/johnfredcee/2007503
 
 '''
+import hashlib
+import itertools
+import json
+import os
 import re
+import struct
+import zlib
 import numpy as np
-from data import Joint, MocapData
+from data import Joint, MocapData, MOCAP_MAGIC, MOCAP_VERSION, MOCAP_SUFFIX
+from writers import MocapFileWriter
+
+# sidecar of a parsed BVH file (see BVHParser.parse): an uncompressed motion file (see data.MOCAP_MAGIC)
+# with the size, modification time and hash of the BVH file in its metadata
+CACHE_SUFFIX = '.cache'
 
 
 class BVHScanner:
@@ -56,7 +67,14 @@ class BVHParser():
     A class to parse a BVH file.
     
     Extracts the skeleton and channel values
+
+    Only the hierarchy and the motion header are tokenized, the frame values
+    are read in one pass into a (frames, channels) array
     '''
+
+    # end of the motion header, the frame values follow
+    MOTION_HEADER = re.compile(r'\bMOTION\s+Frames:\s*\S+\s+Frame\s+Time:\s*\S+')
+
     def __init__(self, filename=None):
         self.reset()
 
@@ -64,7 +82,8 @@ class BVHParser():
         self._skeleton = {}
         self.bone_context = []
         self._motion_channels = []
-        self._motions = []
+        self._motions = np.empty((0, 0))
+        self._frame_count = 0
         self.current_token = 0
         self.framerate = 0.0
         self.root_name = ''
@@ -74,34 +93,256 @@ class BVHParser():
         self.data = MocapData()
 
 
-    def parse(self, filename):
+    def parse(self, filename, cache=False, joints=None, frames=None):
+        '''
+        cache=True reuses the binary sidecar (filename + CACHE_SUFFIX) written by a
+        previous parse of the same file, the values are memory-mapped instead of parsed.
+        Without a valid sidecar the file is parsed and the sidecar is written
+
+        joints: names of the joints whose channels are loaded (default all), the
+        skeleton stays complete
+        frames: slice of the frames to load (default all), the time index keeps the
+        times of the frames in the file. Without cache only the lines of these frames
+        are parsed, in blocks, and only the values of the joints are kept
+        '''
         self.reset()
+        # original frame numbers of the rows in self._motions, None: all frames
+        loaded_frames = None
+        if not (cache and self._read_cache(filename)):
+            if (frames is not None or joints is not None) and not cache:
+                loaded_frames = self._read_frame_lines(filename, frames, joints)
+            if loaded_frames is None:
+                self.reset()
+                self._read_file(filename)
+                if cache:
+                    self._write_cache(filename)
+
+        if loaded_frames is None:
+            loaded_frames = np.arange(self._motions.shape[0])
+            if frames is not None:
+                loaded_frames = loaded_frames[frames]
+                self._motions = self._motions[frames]
+            if joints is not None:
+                self._select_joints(joints)
+
+        self._set_header_data()
+        self.data.values = self._to_DataFrame(self._motions, self._frame_times_of(loaded_frames))
+        return self.data
 
+    def iter_frames(self, filename, chunk_frames=1024, block_size=1 << 20):
+        '''
+        Reads a BVH file in chunks without loading it, for recordings larger than memory
+
+        Yields (data, values): data is the MocapData with skeleton and channels but
+        without values, values a DataFrame with up to chunk_frames frames; the time
+        index continues over the chunks. block_size is the number of characters read
+        from the file at once
+        '''
+        self.reset()
+
+        with open(filename, 'r') as bvh_file:
+            has_motion = self._read_header_lines(bvh_file)
+            self._set_header_data()
+            if not has_motion:
+                return
+
+            n_channels = len(self._motion_channels)
+            frames_left = self._frame_count if n_channels else 0
+            last_time = None
+            pending = np.empty(0)
+            carry = ''
+            while frames_left:
+                block = bvh_file.read(block_size)
+                text = carry + block
+                if block:
+                    # the last number may continue in the next block
+                    split = max(text.rfind(' '), text.rfind('\n'), text.rfind('\t'))
+                    text, carry = (text[:split], text[split:]) if split >= 0 else ('', text)
+                pending = np.concatenate((pending, np.fromstring(text, dtype=np.float64, sep=' ')))
+
+                # complete chunks, at the end of the file also the remaining frames
+                while frames_left and (pending.size >= chunk_frames * n_channels
+                                       or (not block and pending.size >= n_channels)):
+                    n_frames = min(pending.size // n_channels, chunk_frames, frames_left)
+                    values = pending[:n_frames * n_channels].reshape(n_frames, n_channels)
+                    pending = pending[n_frames * n_channels:]
+                    frames_left -= n_frames
+
+                    frame_times = self._frame_times(n_frames, last_time)
+                    last_time = frame_times[-1]
+                    yield self.data, self._to_DataFrame(values, frame_times)
+                if not block:
+                    break
+
+    @staticmethod
+    def _source_key(filename, with_hash=True):
+        '''Identifies the content of the BVH file: size, modification time and hash'''
+        stat = os.stat(filename)
+        key = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+        if with_hash:
+            file_hash = hashlib.blake2b(digest_size=16)
+            with open(filename, 'rb') as bvh_file:
+                for block in iter(lambda: bvh_file.read(1 << 20), b''):
+                    file_hash.update(block)
+            key['hash'] = file_hash.hexdigest()
+        return key
+
+    def _read_cache(self, filename):
+        '''Loads skeleton and values (memory-mapped) from the sidecar, False if there is none for this content of the file'''
+        cache_filename = filename + CACHE_SUFFIX
+        if not os.path.isfile(cache_filename):
+            return False
+
+        mocap_parser = MocapFileParser()
+        try:
+            index, values = mocap_parser.read(cache_filename)
+        except ValueError:
+            return False
+        cached_source = mocap_parser.metadata.get('source')
+        if cached_source is None:
+            return False
+        # unchanged size and modification time, otherwise (i.e. copied file) compare the content
+        source = self._source_key(filename, with_hash=False)
+        if source['size'] != cached_source['size']:
+            return False
+        update_source = source['mtime_ns'] != cached_source['mtime_ns']
+        if update_source:
+            source = self._source_key(filename)
+            if source['hash'] != cached_source['hash']:
+                return False
+
+        header = mocap_parser.header
+        self._skeleton = header['skeleton']
+        self._motion_channels = [tuple(channel) for channel in header['channel_names']]
+        self.root_name = header['root_name']
+        self.framerate = header['framerate']
+        self._motions = values
+
+        if update_source:
+            # same content, the next load does not hash the file again
+            try:
+                if not MocapFileWriter.update_metadata(cache_filename, {'source': source}):
+                    self._motions = np.array(values)
+                    self._write_cache(filename, source)
+            except OSError as error:
+                print('BVH cache not updated: {}'.format(error))
+        return True
+
+    def _write_cache(self, filename, source=None):
+        '''Writes skeleton and values of the parsed file to the sidecar, source: _source_key of the file'''
+        self._set_header_data()
+        self.data.values = self._to_DataFrame()
+        try:
+            MocapFileWriter().write(self.data, filename + CACHE_SUFFIX,
+                                    metadata={'source': source or self._source_key(filename)})
+        except OSError as error:
+            print('BVH cache not written: {}'.format(error))
+
+    def _read_file(self, filename):
+        '''Parses the whole file: hierarchy tokenized, frame values in one pass'''
         with open(filename, 'r') as bvh_file:
             raw_contents = bvh_file.read()
-        tokens, remainder = self.scanner.scan(raw_contents)
+
+        motion_header = self.MOTION_HEADER.search(raw_contents)
+        header_end = motion_header.end() if motion_header else len(raw_contents)
+        if self._parse_header(raw_contents[:header_end]):
+            self._read_motion_values(raw_contents[header_end:])
+
+    def _read_header_lines(self, bvh_file):
+        '''Parses the lines up to the frame time, the file is positioned at the first frame'''
+        header_lines = []
+        for line in bvh_file:
+            header_lines.append(line)
+            if line.lstrip().startswith('Frame Time'):
+                break
+        return self._parse_header(''.join(header_lines))
+
+    def _read_frame_lines(self, filename, frames=None, joints=None, block_frames=1024):
+        '''
+        Parses only the lines of the selected frames (one frame per line) in blocks of block_frames
+        lines and keeps the values of the selected joints, returns their frame numbers or None if
+        the file does not have one frame per line
+        '''
+        with open(filename, 'r') as bvh_file:
+            has_motion = self._read_header_lines(bvh_file)
+            n_channels = len(self._motion_channels)
+            columns = self._select_channels(joints) if joints is not None else slice(None)
+            selected = np.arange(self._frame_count if has_motion else 0)
+            if frames is not None:
+                selected = selected[frames]
+            self._motions = np.empty((selected.size, len(self._motion_channels)))
+            if not selected.size:
+                return selected
+
+            # the lines in between are skipped without parsing, reading stops after the last frame
+            first, last = selected.min(), selected.max()
+            step = abs(frames.step or 1) if frames is not None else 1
+            lines = itertools.islice(bvh_file, first, last + 1, step)
+            row = 0
+            while row < selected.size:
+                block = list(itertools.islice(lines, block_frames))
+                values = np.fromstring(''.join(block), dtype=np.float64, sep=' ')
+                if not block or values.size != len(block) * n_channels:
+                    return None
+                self._motions[row:row + len(block)] = values.reshape(len(block), n_channels)[:, columns]
+                row += len(block)
+
+        if selected[0] != first:
+            self._motions = self._motions[::-1]
+        return selected
+
+    def _select_channels(self, joints):
+        '''Keeps the channels of the joints, returns the indices of their columns'''
+        unknown = set(joints) - set(self._skeleton)
+        if unknown:
+            raise ValueError('Unknown joints: {}'.format(', '.join(sorted(unknown))))
+        joints = set(joints)
+        columns = [index for index, (joint_name, channel) in enumerate(self._motion_channels)
+                   if joint_name in joints]
+        self._motion_channels = [self._motion_channels[index] for index in columns]
+        return columns
+
+    def _select_joints(self, joints):
+        '''Keeps the channels (and values) of the joints'''
+        self._motions = self._motions[:, self._select_channels(joints)]
+
+    def _frame_times_of(self, frame_numbers):
+        '''Times of the frames with these numbers, as they are summed up when reading all frames'''
+        if not frame_numbers.size:
+            return np.empty(0)
+        return self._frame_times(frame_numbers.max() + 1)[frame_numbers]
+
+    def _parse_header(self, header_text):
+        '''Tokenizes and parses the hierarchy and the motion header, True if the frame values follow'''
+        tokens, remainder = self.scanner.scan(header_text)
         self._parse_hierarchy(tokens)
         self.current_token = self.current_token + 1
-        self._parse_motion(tokens)
-        
+        self._motions = np.empty((0, len(self._motion_channels)))
+        return bool(self._parse_motion(tokens))
+
+    def _set_header_data(self):
         self.data.skeleton = self._skeleton
         self.data.channel_names = self._motion_channels
-        self.data.values = self._to_DataFrame()
         self.data.root_name = self.root_name
         self.data.framerate = self.framerate
-
-        return self.data
     
-    def _to_DataFrame(self):
-        '''Returns all of the channels parsed from the file as a pandas DataFrame'''
+    def _to_DataFrame(self, values=None, frame_times=None):
+        '''Returns all of the channels parsed from the file (or a chunk of values) as a pandas DataFrame'''
 
         import pandas as pd
-        time_index = pd.to_timedelta([f[0] for f in self._motions], unit='s')
-        frames = [f[1] for f in self._motions]
-        channels = np.asarray([[channel[2] for channel in frame] for frame in frames])
+        if values is None:
+            values = self._motions
+            frame_times = self._frame_times(values.shape[0])
+        time_index = pd.to_timedelta(frame_times, unit='s')
         column_names = ['%s_%s'%(c[0], c[1]) for c in self._motion_channels]
 
-        return pd.DataFrame(data=channels, index=time_index, columns=column_names)
+        return pd.DataFrame(data=values, index=time_index, columns=column_names, copy=False)
+
+    def _frame_times(self, n_frames, last_time=None):
+        '''Times of n_frames frames after the frame at last_time, summed up frame by frame starting at 0'''
+        frame_times = np.full(n_frames, self.framerate)
+        frame_times[:1] = 0.0 if last_time is None else last_time + self.framerate
+        return np.cumsum(frame_times)
 
 
     def _new_bone(self, parent, name):
@@ -229,15 +470,74 @@ class BVHParser():
         frame_rate = float(bvh[self.current_token][1])
 
         self.framerate = frame_rate
+        self._frame_count = frame_count
        
         self.current_token = self.current_token + 1
-       
-        frame_time = 0.0
-        self._motions = [()] * frame_count
-        for i in range(frame_count):
-            channel_values = []
-            for channel in self._motion_channels:
-                channel_values.append((channel[0], channel[1], float(bvh[self.current_token][1])))
-                self.current_token = self.current_token + 1
-            self._motions[i] = (frame_time, channel_values)
-            frame_time = frame_time + frame_rate
+        return True
+
+    def _read_motion_values(self, motion_text):
+        '''Reads the frame values (whitespace separated numbers) following the motion header at once'''
+        n_channels = len(self._motion_channels)
+        values = np.fromstring(motion_text, dtype=np.float64, sep=' ')
+        # incomplete last frame (i.e. file still being written) is ignored
+        frame_count = min(self._frame_count, values.size // n_channels) if n_channels else 0
+        self._motions = values[:frame_count * n_channels].reshape(frame_count, n_channels)
+
+
+class MocapFileParser():
+    '''
+    Loads a binary motion file (see writers.MocapFileWriter) into MocapData
+
+    Uncompressed values are memory-mapped copy-on-write (mmap=True), they can be
+    changed in memory without modifying the file
+    '''
+    def __init__(self):
+        self.header = {}
+        self.metadata = {}
+
+    def parse(self, filename, mmap=True):
+        import pandas as pd
+        index, values = self.read(filename, mmap)
+
+        data = MocapData()
+        data.skeleton = self.header['skeleton']
+        data.channel_names = [tuple(channel) for channel in self.header['channel_names']]
+        data.root_name = self.header['root_name']
+        data.framerate = self.header['framerate']
+        time_index = pd.to_timedelta(index, unit='ns') if index is not None else None
+        data.values = pd.DataFrame(data=values, index=time_index, columns=self.header['columns'], copy=False)
+        return data
+
+    def read(self, filename, mmap=True):
+        '''Reads the header, returns the time index (int64 ns, None if there is none) and the values (frames, columns)'''
+        with open(filename, 'rb') as mocap_file:
+            if mocap_file.read(len(MOCAP_MAGIC)) != MOCAP_MAGIC:
+                raise ValueError('"{}" is not a motion file'.format(filename))
+            header_size, = struct.unpack('<Q', mocap_file.read(8))
+            header = json.loads(mocap_file.read(header_size).decode('utf-8'))
+            if header['version'] != MOCAP_VERSION:
+                raise ValueError('"{}" uses a different motion file version'.format(filename))
+
+            index_bytes = mocap_file.read(header['index_size'])
+            values_offset = mocap_file.tell()
+            shape = (header['frames'], len(header['columns']))
+            dtype = np.dtype(header['dtype'])
+            if header['compression'] == 'zlib':
+                index_bytes = zlib.decompress(index_bytes)
+                values = np.frombuffer(bytearray(zlib.decompress(mocap_file.read(header['values_size']))), dtype)
+            elif mmap and shape[0] and shape[1]:
+                values = np.memmap(filename, dtype=dtype, mode='c', offset=values_offset, shape=shape)
+            else:
+                values = np.fromfile(mocap_file, dtype=dtype, count=shape[0] * shape[1])
+
+        self.header = header
+        self.metadata = header['metadata']
+        index = np.frombuffer(index_bytes, dtype='<i8') if header['time_index'] else None
+        return index, values.reshape(shape)
+
+
+def parse_file(filename, cache=False):
+    '''Loads a BVH file (cache: see BVHParser.parse) or a binary motion file (MOCAP_SUFFIX) into MocapData'''
+    if filename.lower().endswith(MOCAP_SUFFIX):
+        return MocapFileParser().parse(filename)
+    return BVHParser().parse(filename, cache=cache)
@@ -9,7 +9,14 @@ import pandas as pd
 import numpy as np
 from sklearn.base import BaseEstimator, TransformerMixin
 
-from pymo.rotation_tools import Rotation
+from pymo.rotation_tools import euler2rotmat, rotmat2euler, rotmat2expmap, expmap2rotmat, rotmat2quat, quat2rotmat
+
+def _column_indices(df, columns):
+    '''Positions of the columns in df, KeyError naming the missing ones'''
+    indices = df.columns.get_indexer(columns)
+    if (indices < 0).any():
+        raise KeyError('Missing channels: %s'%', '.join(column for column, index in zip(columns, indices) if index < 0))
+    return indices
 
 class MocapParameterizer(BaseEstimator, TransformerMixin):
     def __init__(self, param_type = 'euler'):
@@ -28,7 +35,7 @@ class MocapParameterizer(BaseEstimator, TransformerMixin):
         elif self.param_type == 'expmap':
             return self._to_expmap(X)
         elif self.param_type == 'quat':
-            return X
+            return self._to_quat(X)
         elif self.param_type == 'position':
             return self._to_pos(X)
         else:
@@ -42,7 +49,7 @@ class MocapParameterizer(BaseEstimator, TransformerMixin):
         elif self.param_type == 'expmap':
             return self._expmap_to_euler(X)
         elif self.param_type == 'quat':
-            raise 'quat2euler is not supported'
+            return self._quat_to_euler(X)
         elif self.param_type == 'position':
             # raise 'positions 2 eulers is not supported'
             print('positions 2 eulers is not supported')
@@ -55,177 +62,174 @@ class MocapParameterizer(BaseEstimator, TransformerMixin):
 
         Q = []
         for track in X:
-            channels = []
-            titles = []
             euler_df = track.values
 
-            # Create a new DataFrame to store the exponential map rep
-            pos_df = pd.DataFrame(index=euler_df.index)
+            # parents before their children
+            joints = list(track.traverse())
+            joint_index = {joint: index for index, joint in enumerate(joints)}
+            n_frames = euler_df.shape[0]
+            n_joints = len(joints)
+
+            # the channels of each joint by their exact name (in xyz order), missing channels are 0
+            rot_values = self._joint_channels(euler_df, joints, 'rotation')
+            pos_values = self._joint_channels(euler_df, joints, 'position')
+            offsets = np.asarray([track.skeleton[joint]['offsets'] for joint in joints], dtype=float)
+
+            # Convert the eulers of all frames and joints to rotation matrices
+            rotmats = euler2rotmat(rot_values)
+
+            # global rotation and position, one batched product for all joints with the same depth
+            global_rotmats = np.empty((n_frames, n_joints, 3, 3))
+            global_pos = np.empty((n_frames, n_joints, 3))
+            depth = np.zeros(n_joints, dtype=int)
+            parent_index = np.zeros(n_joints, dtype=int)
+            for index, joint in enumerate(joints):
+                if joint == track.root_name:
+                    # the root position is not offset
+                    global_rotmats[:, index] = rotmats[:, index]
+                    global_pos[:, index] = pos_values[:, index]
+                    continue
+                parent_index[index] = joint_index[track.skeleton[joint]['parent']]
+                depth[index] = depth[parent_index[index]] + 1
+
+            for level in range(1, depth.max() + 1 if n_joints else 1):
+                level_joints = np.flatnonzero(depth == level)
+                parent_rotmats = global_rotmats[:, parent_index[level_joints]]
+
+                # multiply the rotmats of the joints to the rotmats of their parents
+                global_rotmats[:, level_joints] = np.matmul(rotmats[:, level_joints], parent_rotmats)
+
+                # offset plus position channel, rotated by the parent and added to the position of the parent
+                k = pos_values[:, level_joints] + offsets[level_joints]
+                global_pos[:, level_joints] = np.matmul(k[..., np.newaxis, :], parent_rotmats)[..., 0, :] + \
+                    global_pos[:, parent_index[level_joints]]
+
+            # Create the position columns for all joints at once
+            pos_columns = ['%s_%sposition'%(joint, axis) for joint in joints for axis in 'XYZ']
+            pos_df = pd.DataFrame(data=global_pos.reshape(n_frames, -1), index=euler_df.index, columns=pos_columns)
 
-            # Copy the root rotations into the new DataFrame
-            # rxp = '%s_Xrotation'%track.root_name
-            # ryp = '%s_Yrotation'%track.root_name
-            # rzp = '%s_Zrotation'%track.root_name
-            # pos_df[rxp] = pd.Series(data=euler_df[rxp], index=pos_df.index)
-            # pos_df[ryp] = pd.Series(data=euler_df[ryp], index=pos_df.index)
-            # pos_df[rzp] = pd.Series(data=euler_df[rzp], index=pos_df.index)
+            new_track = track.clone()
+            new_track.values = pos_df
+            Q.append(new_track)
+        return Q
 
-            # List the columns that contain rotation channels
-            rot_cols = [c for c in euler_df.columns if ('rotation' in c)]
+    @staticmethod
+    def _joint_channels(df, joints, channel_type):
+        '''
+        Values (frames, joints, 3) of the X, Y, Z channels of the type (rotation or position),
+        0 for joints without channels of the type, KeyError for joints with only some of them
+        '''
+        columns = ['%s_%s%s'%(joint, axis, channel_type) for joint in joints for axis in 'XYZ']
+        column_index = df.columns.get_indexer(columns)
+        available = column_index >= 0
+        partial = available.reshape(-1, 3).any(axis=1) & ~available.reshape(-1, 3).all(axis=1)
+        if partial.any():
+            missing = [column for column, index, joint_partial in zip(columns, column_index, np.repeat(partial, 3))
+                       if index < 0 and joint_partial]
+            raise KeyError('Missing channels: %s'%', '.join(missing))
+        values = np.zeros((df.shape[0], len(columns)))
+        values[:, available] = df.to_numpy(dtype=float)[:, column_index[available]]
+        return values.reshape(df.shape[0], len(joints), 3)
 
-            # List the columns that contain position channels
-            pos_cols = [c for c in euler_df.columns if ('position' in c)]
 
-            # List the joints that are not end sites, i.e., have channels
-            joints = (joint for joint in track.skeleton)
-            
-            tree_data = {}
-
-            for joint in track.traverse():
-                parent = track.skeleton[joint]['parent']
-
-                # Get the rotation columns that belong to this joint
-                rc = euler_df[[c for c in rot_cols if joint in c]]
-
-                # Get the position columns that belong to this joint
-                pc = euler_df[[c for c in pos_cols if joint in c]]
-
-                # Make sure the columns are organized in xyz order
-                if rc.shape[1] < 3:
-                    euler_values = [[0,0,0] for f in rc.iterrows()]
-                else:
-                    euler_values = [[f[1]['%s_Xrotation'%joint], 
-                                     f[1]['%s_Yrotation'%joint], 
-                                     f[1]['%s_Zrotation'%joint]] for f in rc.iterrows()]
-
-                if pc.shape[1] < 3:
-                    pos_values = [[0,0,0] for f in pc.iterrows()]
-                else:
-                    pos_values =[[f[1]['%s_Xposition'%joint], 
-                                  f[1]['%s_Yposition'%joint], 
-                                  f[1]['%s_Zposition'%joint]] for f in pc.iterrows()]
-
-                #euler_values = [[0,0,0] for f in rc.iterrows()] #for deugging
-                #pos_values = [[0,0,0] for f in pc.iterrows()] #for deugging
-                
-                # Convert the eulers to rotation matrices
-                rotmats = np.asarray([Rotation([f[0], f[1], f[2]], 'euler', from_deg=True).rotmat for f in euler_values])                  
-                tree_data[joint]=[
-                                    [], # to store the rotation matrix
-                                    []  # to store the calculated position
-                                 ] 
+    def _to_expmap(self, X):
+        '''Converts Euler angles to Exponential Maps'''
 
-                if track.root_name == joint:
-                    tree_data[joint][0] = rotmats
-                    # tree_data[joint][1] = np.add(pos_values, track.skeleton[joint]['offsets'])
-                    tree_data[joint][1] = pos_values
-                else:
-                    # for every frame i, multiply this joint's rotmat to the rotmat of its parent
-                    tree_data[joint][0] = np.asarray([np.matmul(rotmats[i], tree_data[parent][0][i]) 
-                                                      for i in range(len(tree_data[parent][0]))])
+        Q = []
+        for track in X:
+            euler_df = track.values
 
-                    # add the position channel to the offset and store it in k, for every frame i
-                    k = np.asarray([np.add(pos_values[i],  track.skeleton[joint]['offsets'])
-                                    for i in range(len(tree_data[parent][0]))])
+            # The root positions are copied, the joints that are not end sites have rotation channels
+            root_pos = ['%s_%sposition'%(track.root_name, axis) for axis in 'XYZ']
+            joints = [joint for joint in track.skeleton if 'Nub' not in joint]
 
-                    # multiply k to the rotmat of the parent for every frame i
-                    q = np.asarray([np.matmul(k[i], tree_data[parent][0][i]) 
-                                    for i in range(len(tree_data[parent][0]))])
+            # Convert the eulers of all frames and joints to exp maps at once
+            eulers = self._joint_channels(euler_df, joints, 'rotation')
+            exps = rotmat2expmap(euler2rotmat(eulers))
 
-                    # add q to the position of the parent, for every frame i
-                    tree_data[joint][1] = np.asarray([np.add(q[i], tree_data[parent][1][i])
-                                                      for i in range(len(tree_data[parent][1]))])
+            exp_columns = ['%s_%s'%(joint, param) for joint in joints for param in ('alpha', 'beta', 'gamma')]
+            exp_df = pd.DataFrame(data=np.concatenate((euler_df[root_pos].to_numpy(dtype=float),
+                                                       exps.reshape(exps.shape[0], -1)), axis=1),
+                                  index=euler_df.index, columns=root_pos + exp_columns)
 
+            new_track = track.clone()
+            new_track.values = exp_df
+            Q.append(new_track)
+
+        return Q
+
+    def _expmap_to_euler(self, X):
+        '''Converts Exponential Maps to Euler angles, the inverse of _to_expmap'''
+        Q = []
+        for track in X:
+            exp_df = track.values
 
-                # Create the corresponding columns in the new DataFrame
-                pos_df['%s_Xposition'%joint] = pd.Series(data=[e[0] for e in tree_data[joint][1]], index=pos_df.index)
-                pos_df['%s_Yposition'%joint] = pd.Series(data=[e[1] for e in tree_data[joint][1]], index=pos_df.index)
-                pos_df['%s_Zposition'%joint] = pd.Series(data=[e[2] for e in tree_data[joint][1]], index=pos_df.index)
+            # The root positions are copied, the joints that are not end sites have exp map parameters
+            root_pos = ['%s_%sposition'%(track.root_name, axis) for axis in 'XYZ']
+            joints = [joint for joint in track.skeleton if 'Nub' not in joint]
 
+            # Convert the exp maps of all frames and joints to eulers at once
+            exp_columns = ['%s_%s'%(joint, param) for joint in joints for param in ('alpha', 'beta', 'gamma')]
+            expmaps = exp_df[exp_columns].to_numpy(dtype=float).reshape(exp_df.shape[0], len(joints), 3)
+            euler_rots = rotmat2euler(expmap2rotmat(expmaps), use_deg=True)
+
+            rot_columns = ['%s_%srotation'%(joint, axis) for joint in joints for axis in 'XYZ']
+            euler_df = pd.DataFrame(data=np.concatenate((exp_df[root_pos].to_numpy(dtype=float),
+                                                         euler_rots.reshape(euler_rots.shape[0], -1)), axis=1),
+                                    index=exp_df.index, columns=root_pos + rot_columns)
 
             new_track = track.clone()
-            new_track.values = pos_df
+            new_track.values = euler_df
             Q.append(new_track)
+
         return Q
 
 
-    def _to_expmap(self, X):
-        '''Converts Euler angles to Exponential Maps'''
+    def _to_quat(self, X):
+        '''Converts Euler angles to unit quaternions (w, x, y, z)'''
 
         Q = []
         for track in X:
-            channels = []
-            titles = []
             euler_df = track.values
 
-            # Create a new DataFrame to store the exponential map rep
-            exp_df = pd.DataFrame(index=euler_df.index)
-
-            # Copy the root positions into the new DataFrame
-            rxp = '%s_Xposition'%track.root_name
-            ryp = '%s_Yposition'%track.root_name
-            rzp = '%s_Zposition'%track.root_name
-            exp_df[rxp] = pd.Series(data=euler_df[rxp], index=exp_df.index)
-            exp_df[ryp] = pd.Series(data=euler_df[ryp], index=exp_df.index)
-            exp_df[rzp] = pd.Series(data=euler_df[rzp], index=exp_df.index)
-            
-            # List the columns that contain rotation channels
-            rots = [c for c in euler_df.columns if ('rotation' in c and 'Nub' not in c)]
+            # The root positions are copied, the joints that are not end sites have rotation channels
+            root_pos = ['%s_%sposition'%(track.root_name, axis) for axis in 'XYZ']
+            joints = [joint for joint in track.skeleton if 'Nub' not in joint]
 
-            # List the joints that are not end sites, i.e., have channels
-            joints = (joint for joint in track.skeleton if 'Nub' not in joint)
+            # Convert the eulers of all frames and joints to quaternions at once
+            eulers = self._joint_channels(euler_df, joints, 'rotation')
+            quats = rotmat2quat(euler2rotmat(eulers))
 
-            for joint in joints:
-                r = euler_df[[c for c in rots if joint in c]] # Get the columns that belong to this joint
-                euler = [[f[1]['%s_Xrotation'%joint], f[1]['%s_Yrotation'%joint], f[1]['%s_Zrotation'%joint]] for f in r.iterrows()] # Make sure the columsn are organized in xyz order
-                exps = [Rotation(f, 'euler', from_deg=True).to_expmap() for f in euler] # Convert the eulers to exp maps
-                
-                # Create the corresponding columns in the new DataFrame
-    
-                exp_df['%s_alpha'%joint] = pd.Series(data=[e[0] for e in exps], index=exp_df.index)
-                exp_df['%s_beta'%joint] = pd.Series(data=[e[1] for e in exps], index=exp_df.index)
-                exp_df['%s_gamma'%joint] = pd.Series(data=[e[2] for e in exps], index=exp_df.index)
+            quat_columns = ['%s_%s'%(joint, param) for joint in joints for param in ('qw', 'qx', 'qy', 'qz')]
+            quat_df = pd.DataFrame(data=np.concatenate((euler_df[root_pos].to_numpy(dtype=float),
+                                                        quats.reshape(quats.shape[0], -1)), axis=1),
+                                   index=euler_df.index, columns=root_pos + quat_columns)
 
             new_track = track.clone()
-            new_track.values = exp_df
+            new_track.values = quat_df
             Q.append(new_track)
 
         return Q
 
-    def _expmap_to_euler(self, X):
+    def _quat_to_euler(self, X):
+        '''Converts quaternions to Euler angles, the inverse of _to_quat'''
         Q = []
         for track in X:
-            channels = []
-            titles = []
-            exp_df = track.values
+            quat_df = track.values
 
-            # Create a new DataFrame to store the exponential map rep
-            euler_df = pd.DataFrame(index=exp_df.index)
+            # The root positions are copied, the joints that are not end sites have quaternion parameters
+            root_pos = ['%s_%sposition'%(track.root_name, axis) for axis in 'XYZ']
+            joints = [joint for joint in track.skeleton if 'Nub' not in joint]
 
-            # Copy the root positions into the new DataFrame
-            rxp = '%s_Xposition'%track.root_name
-            ryp = '%s_Yposition'%track.root_name
-            rzp = '%s_Zposition'%track.root_name
-            euler_df[rxp] = pd.Series(data=exp_df[rxp], index=euler_df.index)
-            euler_df[ryp] = pd.Series(data=exp_df[ryp], index=euler_df.index)
-            euler_df[rzp] = pd.Series(data=exp_df[rzp], index=euler_df.index)
-            
-            # List the columns that contain rotation channels
-            exp_params = [c for c in exp_df.columns if ( any(p in c for p in ['alpha', 'beta','gamma']) and 'Nub' not in c)]
-
-            # List the joints that are not end sites, i.e., have channels
-            joints = (joint for joint in track.skeleton if 'Nub' not in joint)
+            # Convert the quaternions of all frames and joints to eulers at once
+            quat_columns = ['%s_%s'%(joint, param) for joint in joints for param in ('qw', 'qx', 'qy', 'qz')]
+            quats = quat_df[quat_columns].to_numpy(dtype=float).reshape(quat_df.shape[0], len(joints), 4)
+            euler_rots = rotmat2euler(quat2rotmat(quats), use_deg=True)
 
-            for joint in joints:
-                r = exp_df[[c for c in exp_params if joint in c]] # Get the columns that belong to this joint
-                expmap = [[f[1]['%s_alpha'%joint], f[1]['%s_beta'%joint], f[1]['%s_gamma'%joint]] for f in r.iterrows()] # Make sure the columsn are organized in xyz order
-                euler_rots = [Rotation(f, 'expmap').to_euler(True)[0] for f in expmap] # Convert the eulers to exp maps
-                
-                # Create the corresponding columns in the new DataFrame
-    
-                euler_df['%s_Xrotation'%joint] = pd.Series(data=[e[0] for e in euler_rots], index=euler_df.index)
-                euler_df['%s_Yrotation'%joint] = pd.Series(data=[e[1] for e in euler_rots], index=euler_df.index)
-                euler_df['%s_Zrotation'%joint] = pd.Series(data=[e[2] for e in euler_rots], index=euler_df.index)
+            rot_columns = ['%s_%srotation'%(joint, axis) for joint in joints for axis in 'XYZ']
+            euler_df = pd.DataFrame(data=np.concatenate((quat_df[root_pos].to_numpy(dtype=float),
+                                                         euler_rots.reshape(euler_rots.shape[0], -1)), axis=1),
+                                    index=quat_df.index, columns=root_pos + rot_columns)
 
             new_track = track.clone()
             new_track.values = euler_df
@@ -325,84 +329,34 @@ class RootTransformer(BaseEstimator, TransformerMixin):
     def fit(self, X, y=None):
         return self
     
+    def _root_columns(self, track):
+        '''Absolute root columns of the method and the columns of their deltas'''
+        if self.method == 'abdolute_translation_deltas':
+            channels = ['Xposition', 'Zposition']
+        elif self.method == 'pos_rot_deltas':
+            channels = ['Xposition', 'Zposition', 'Xrotation', 'Yrotation', 'Zrotation']
+        else:
+            raise ValueError('method must be abdolute_translation_deltas or pos_rot_deltas, not %s'%self.method)
+
+        absolute_cols = ['%s_%s'%(track.root_name, channel) for channel in channels]
+        delta_cols = ['%s_d%s'%(track.root_name, channel) for channel in channels]
+        return absolute_cols, delta_cols
+
     def transform(self, X, y=None):
         Q = []
 
         for track in X:
-            if self.method == 'abdolute_translation_deltas':
-                new_df = track.values.copy()
-                xpcol = '%s_Xposition'%track.root_name
-                ypcol = '%s_Yposition'%track.root_name
-                zpcol = '%s_Zposition'%track.root_name
-
-
-                dxpcol = '%s_dXposition'%track.root_name
-                dzpcol = '%s_dZposition'%track.root_name
-
-                dx = track.values[xpcol].diff()
-                dz = track.values[zpcol].diff()    
-
-                dx[0] = 0
-                dz[0] = 0
-
-                new_df.drop([xpcol, zpcol], axis=1, inplace=True)
-
-                new_df[dxpcol] = dx
-                new_df[dzpcol] = dz
-                
-                new_track = track.clone()
-                new_track.values = new_df
-            # end of abdolute_translation_deltas
-            
-            elif self.method == 'pos_rot_deltas':
-                new_track = track.clone()
-
-                # Absolute columns
-                xp_col = '%s_Xposition'%track.root_name
-                yp_col = '%s_Yposition'%track.root_name
-                zp_col = '%s_Zposition'%track.root_name
-
-                xr_col = '%s_Xrotation'%track.root_name
-                yr_col = '%s_Yrotation'%track.root_name
-                zr_col = '%s_Zrotation'%track.root_name
-
-                # Delta columns
-                dxp_col = '%s_dXposition'%track.root_name
-                dzp_col = '%s_dZposition'%track.root_name
-
-                dxr_col = '%s_dXrotation'%track.root_name
-                dyr_col = '%s_dYrotation'%track.root_name
-                dzr_col = '%s_dZrotation'%track.root_name
-
-
-                new_df = track.values.copy()
-
-                root_pos_x_diff = pd.Series(data=track.values[xp_col].diff(), index=new_df.index)
-                root_pos_z_diff = pd.Series(data=track.values[zp_col].diff(), index=new_df.index)
+            absolute_cols, delta_cols = self._root_columns(track)
 
-                root_rot_y_diff = pd.Series(data=track.values[yr_col].diff(), index=new_df.index)
-                root_rot_x_diff = pd.Series(data=track.values[xr_col].diff(), index=new_df.index)
-                root_rot_z_diff = pd.Series(data=track.values[zr_col].diff(), index=new_df.index)
+            # Difference to the previous frame, 0 for the first frame
+            absolute = track.values[absolute_cols].to_numpy(dtype=float)
+            deltas = np.diff(absolute, axis=0, prepend=absolute[:1])
 
+            new_df = track.values.drop(absolute_cols, axis=1)
+            new_df[delta_cols] = deltas
 
-                root_pos_x_diff[0] = 0
-                root_pos_z_diff[0] = 0
-
-                root_rot_y_diff[0] = 0
-                root_rot_x_diff[0] = 0
-                root_rot_z_diff[0] = 0
-
-                new_df.drop([xr_col, yr_col, zr_col, xp_col, zp_col], axis=1, inplace=True)
-
-                new_df[dxp_col] = root_pos_x_diff
-                new_df[dzp_col] = root_pos_z_diff
-
-                new_df[dxr_col] = root_rot_x_diff
-                new_df[dyr_col] = root_rot_y_diff
-                new_df[dzr_col] = root_rot_z_diff
-
-                new_track.values = new_df
-
+            new_track = track.clone()
+            new_track.values = new_df
             Q.append(new_track)
 
         return Q
@@ -410,8 +364,6 @@ class RootTransformer(BaseEstimator, TransformerMixin):
     def inverse_transform(self, X, copy=None, start_pos=None):
         Q = []
 
-        #TODO: simplify this implementation
-
         startx = 0
         startz = 0
 
@@ -419,99 +371,19 @@ class RootTransformer(BaseEstimator, TransformerMixin):
             startx, startz = start_pos
 
         for track in X:
-            new_track = track.clone()
-            if self.method == 'abdolute_translation_deltas':
-                new_df = new_track.values
-                xpcol = '%s_Xposition'%track.root_name
-                ypcol = '%s_Yposition'%track.root_name
-                zpcol = '%s_Zposition'%track.root_name
-
-
-                dxpcol = '%s_dXposition'%track.root_name
-                dzpcol = '%s_dZposition'%track.root_name
-
-                dx = track.values[dxpcol].values
-                dz = track.values[dzpcol].values
-
-                recx = [startx]
-                recz = [startz]
-
-                for i in range(dx.shape[0]-1):
-                    recx.append(recx[i]+dx[i+1])
-                    recz.append(recz[i]+dz[i+1])
-
-                # recx = [recx[i]+dx[i+1] for i in range(dx.shape[0]-1)]
-                # recz = [recz[i]+dz[i+1] for i in range(dz.shape[0]-1)]
-                # recx = dx[:-1] + dx[1:]
-                # recz = dz[:-1] + dz[1:]
-
-                new_df[xpcol] = pd.Series(data=recx, index=new_df.index)
-                new_df[zpcol] = pd.Series(data=recz, index=new_df.index)
-
-                new_df.drop([dxpcol, dzpcol], axis=1, inplace=True)
-                
-                new_track.values = new_df
-            # end of abdolute_translation_deltas
-            
-            elif self.method == 'pos_rot_deltas':
-                new_track = track.clone()
-
-                # Absolute columns
-                xp_col = '%s_Xposition'%track.root_name
-                yp_col = '%s_Yposition'%track.root_name
-                zp_col = '%s_Zposition'%track.root_name
-
-                xr_col = '%s_Xrotation'%track.root_name
-                yr_col = '%s_Yrotation'%track.root_name
-                zr_col = '%s_Zrotation'%track.root_name
-
-                # Delta columns
-                dxp_col = '%s_dXposition'%track.root_name
-                dzp_col = '%s_dZposition'%track.root_name
-
-                dxr_col = '%s_dXrotation'%track.root_name
-                dyr_col = '%s_dYrotation'%track.root_name
-                dzr_col = '%s_dZrotation'%track.root_name
-
-
-                new_df = track.values.copy()
-
-                dx = track.values[dxp_col].values
-                dz = track.values[dzp_col].values
-
-                drx = track.values[dxr_col].values
-                dry = track.values[dyr_col].values
-                drz = track.values[dzr_col].values
-
-                rec_xp = [startx]
-                rec_zp = [startz]
-
-                rec_xr = [0]
-                rec_yr = [0]
-                rec_zr = [0]
-
-
-                for i in range(dx.shape[0]-1):
-                    rec_xp.append(rec_xp[i]+dx[i+1])
-                    rec_zp.append(rec_zp[i]+dz[i+1])
-                    
-                    rec_xr.append(rec_xr[i]+drx[i+1])
-                    rec_yr.append(rec_yr[i]+dry[i+1])
-                    rec_zr.append(rec_zr[i]+drz[i+1])
-
+            absolute_cols, delta_cols = self._root_columns(track)
 
-                new_df[xp_col] = pd.Series(data=rec_xp, index=new_df.index)
-                new_df[zp_col] = pd.Series(data=rec_zp, index=new_df.index)
+            # The first frame starts at start_pos (rotations at 0), the following frames add their deltas
+            absolute = track.values[delta_cols].to_numpy(dtype=float, copy=True)
+            absolute[0] = 0
+            absolute[0, :2] = startx, startz
+            np.cumsum(absolute, axis=0, out=absolute)
 
-                new_df[xr_col] = pd.Series(data=rec_xr, index=new_df.index)
-                new_df[yr_col] = pd.Series(data=rec_yr, index=new_df.index)
-                new_df[zr_col] = pd.Series(data=rec_zr, index=new_df.index)
-
-                new_df.drop([dxr_col, dyr_col, dzr_col, dxp_col, dzp_col], axis=1, inplace=True)
-
-
-                new_track.values = new_df
+            new_df = track.values.drop(delta_cols, axis=1)
+            new_df[absolute_cols] = absolute
 
+            new_track = track.clone()
+            new_track.values = new_df
             Q.append(new_track)
 
         return Q
@@ -702,11 +574,11 @@ class DownSampler(BaseEstimator, TransformerMixin):
         Q = []
         
         for track in X:
-            #print(track.values.size)
-            #new_track = track.clone()                            
-            #new_track.values = track.values[0:-1:self.rate]            
-            #print(new_track.values.size)
-            new_track = track[0:-1:self.rate]
+            if isinstance(track, np.ndarray):
+                new_track = track[0:-1:self.rate]
+            else:
+                # MocapData: every rate-th frame time, resampled with anti-aliasing
+                new_track = Resampler(1.0 / (track.framerate * self.rate)).transform([track])[0]
             Q.append(new_track)
         
         return Q
@@ -715,6 +587,130 @@ class DownSampler(BaseEstimator, TransformerMixin):
       return X
 
 
+class Resampler(BaseEstimator, TransformerMixin):
+    def __init__(self, frame_rate, cutoff='auto', filter_order=4):
+        '''
+        Resamples MocapData tracks to frame_rate (Hz) on a uniform time grid starting at the first frame
+
+        cutoff: low-pass filter (Hz) applied before the resampling (zero-lag Butterworth of filter_order),
+                'auto' filters at 80% of the new Nyquist frequency when downsampling, None does not filter
+        Rotations are interpolated with slerp (X, Y, Z rotation channels of a joint), all other channels linearly
+        '''
+        self.frame_rate = frame_rate
+        self.cutoff = cutoff
+        self.filter_order = filter_order
+
+    def fit(self, X, y=None):
+        return self
+
+    def transform(self, X, y=None):
+        Q = []
+
+        for track in X:
+            df = track.values
+            times = df.index.total_seconds() if isinstance(df.index, pd.TimedeltaIndex) else df.index
+            times = np.asarray(times, dtype=float)
+            # grid points up to half a source frame after the last frame (frame times of BVH files are rounded)
+            tolerance = 0.5 * np.median(np.diff(times)) if len(times) > 1 else 0.0
+            n_frames = int(np.floor((times[-1] - times[0] + tolerance) * self.frame_rate)) + 1 if len(times) else 0
+            new_times = times[0] + np.arange(n_frames) / self.frame_rate if len(times) else times
+
+            # Joints with all three rotation channels, the remaining channels are interpolated linearly
+            columns = list(df.columns)
+            joints = [joint for joint in track.skeleton
+                      if all('%s_%srotation'%(joint, axis) in columns for axis in 'XYZ')]
+            rot_columns = ['%s_%srotation'%(joint, axis) for joint in joints for axis in 'XYZ']
+            linear_columns = [column for column in columns if column not in set(rot_columns)]
+
+            eulers = self._joint_channels(df, joints)
+            quats = rotmat2quat(euler2rotmat(eulers))
+            # Same hemisphere as the previous frame, the filter and the interpolation take the short way
+            signs = np.where(np.einsum('ijk,ijk->ij', quats[1:], quats[:-1]) < 0, -1.0, 1.0)
+            quats[1:] *= np.cumprod(signs, axis=0)[..., np.newaxis]
+            linear = df[linear_columns].to_numpy(dtype=float)
+
+            cutoff = self._cutoff(times)
+            if cutoff is not None:
+                quats = self._low_pass(quats, times, cutoff)
+                quats /= np.linalg.norm(quats, axis=-1, keepdims=True)
+                linear = self._low_pass(linear, times, cutoff)
+
+            # Neighbouring frames of the new times and the weight of the later one
+            after = np.clip(np.searchsorted(times, new_times, side='right'), 1, max(len(times) - 1, 1))
+            before = after - 1
+            if len(times) > 1:
+                weights = np.clip((new_times - times[before]) / (times[after] - times[before]), 0.0, 1.0)
+            else:
+                after = before = np.zeros(len(new_times), dtype=int)
+                weights = np.zeros(len(new_times))
+
+            new_linear = linear[before] + weights[:, np.newaxis] * (linear[after] - linear[before])
+            new_quats = self._slerp(quats[before], quats[after], weights[:, np.newaxis])
+
+            # Continuous euler angles starting at the same turn as the first frame
+            new_eulers = np.unwrap(rotmat2euler(quat2rotmat(new_quats), use_deg=False), axis=0) * 180 / np.pi
+            if len(new_eulers):
+                new_eulers += 360 * np.round((eulers[:1] - new_eulers[:1]) / 360)
+
+            values = np.empty((len(new_times), len(columns)))
+            values[:, _column_indices(df, linear_columns)] = new_linear
+            values[:, _column_indices(df, rot_columns)] = new_eulers.reshape(len(new_times), -1)
+
+            new_track = track.clone()
+            new_track.values = pd.DataFrame(data=values, index=pd.to_timedelta(new_times, unit='s'), columns=columns)
+            new_track.framerate = 1.0 / self.frame_rate
+            Q.append(new_track)
+
+        return Q
+
+    def inverse_transform(self, X, copy=None):
+        return X
+
+    @staticmethod
+    def _joint_channels(df, joints):
+        '''Euler angles (frames, joints, 3) of the joints'''
+        columns = ['%s_%srotation'%(joint, axis) for joint in joints for axis in 'XYZ']
+        return df[columns].to_numpy(dtype=float).reshape(df.shape[0], len(joints), 3)
+
+    def _cutoff(self, times):
+        if self.cutoff is None or len(times) < 2:
+            return None
+        source_rate = 1.0 / np.median(np.diff(times))
+        if self.cutoff == 'auto':
+            # same or higher frame rate (frame times of BVH files are rounded): nothing to filter
+            if self.frame_rate >= source_rate * (1 - 1e-3):
+                return None
+            cutoff = 0.8 * self.frame_rate / 2
+        else:
+            cutoff = float(self.cutoff)
+        # the source has no content above its Nyquist frequency
+        return cutoff if cutoff < source_rate / 2 else None
+
+    def _low_pass(self, values, times, cutoff):
+        '''Zero-lag Butterworth low-pass filter along the frames of values (frames, ...)'''
+        from scipy.signal import butter, sosfiltfilt
+
+        source_rate = 1.0 / np.median(np.diff(times))
+        sos = butter(self.filter_order, cutoff / (source_rate / 2), output='sos')
+        padlen = min(3 * (2 * len(sos) + 1), values.shape[0] - 1)
+        return sosfiltfilt(sos, values, axis=0, padlen=padlen)
+
+    @staticmethod
+    def _slerp(q0, q1, weights):
+        '''Spherical linear interpolation between the quaternions q0 and q1 (frames, joints, 4)'''
+        weights = weights[..., np.newaxis]
+        dot = np.clip(np.einsum('...i,...i', q0, q1), -1.0, 1.0)[..., np.newaxis]
+        angle = np.arccos(dot)
+        sin_angle = np.sin(angle)
+        # nearly identical quaternions: linear interpolation, normalized below
+        close = sin_angle < 1e-6
+        safe_sin = np.where(close, 1.0, sin_angle)
+        w0 = np.where(close, 1 - weights, np.sin((1 - weights) * angle) / safe_sin)
+        w1 = np.where(close, weights, np.sin(weights * angle) / safe_sin)
+        quats = w0 * q0 + w1 * q1
+        return quats / np.linalg.norm(quats, axis=-1, keepdims=True)
+
+
 #TODO: JointsSelector (x)
 #TODO: SegmentMaker
 #TODO: DynamicFeaturesAdder
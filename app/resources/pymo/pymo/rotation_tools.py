@@ -17,6 +17,157 @@ def deg2rad(x):
 def rad2deg(x):
     return x/math.pi*180
 
+
+def euler2rotmat(eulers, from_deg=True):
+    '''
+    Rotation matrices (..., 3, 3) of euler angles (..., 3) in X, Y, Z order,
+    the same as Rotation(euler, 'euler', from_deg=from_deg).rotmat for all angles at once
+    '''
+    eulers = np.asarray(eulers, dtype=float)
+    if from_deg:
+        eulers = deg2rad(eulers)
+    ca, cb, cg = np.moveaxis(np.cos(eulers), -1, 0)
+    sa, sb, sg = np.moveaxis(np.sin(eulers), -1, 0)
+
+    # Rz * Ry * Rx with the matrices of Rotation._from_euler
+    rotmats = np.empty(eulers.shape[:-1] + (3, 3))
+    rotmats[..., 0, 0] = cg * cb
+    rotmats[..., 0, 1] = cg * (sb * sa) + sg * ca
+    rotmats[..., 0, 2] = cg * (-sb * ca) + sg * sa
+    rotmats[..., 1, 0] = -sg * cb
+    rotmats[..., 1, 1] = -sg * (sb * sa) + cg * ca
+    rotmats[..., 1, 2] = -sg * (-sb * ca) + cg * sa
+    rotmats[..., 2, 0] = sb
+    rotmats[..., 2, 1] = -cb * sa
+    rotmats[..., 2, 2] = cb * ca
+    return rotmats
+
+
+def rotmat2euler(rotmats, use_deg=True):
+    '''
+    Euler angles (..., 3) in X, Y, Z order of rotation matrices (..., 3, 3), the inverse of euler2rotmat:
+    Y rotation in [-90, 90] degrees, at gimbal lock (Y = +-90) the X rotation is 0
+    '''
+    rotmats = np.asarray(rotmats, dtype=float)
+    eulers = np.empty(rotmats.shape[:-1])
+    eulers[..., 1] = np.arcsin(np.clip(rotmats[..., 2, 0], -1.0, 1.0))
+    eulers[..., 0] = np.arctan2(-rotmats[..., 2, 1], rotmats[..., 2, 2])
+    eulers[..., 2] = np.arctan2(-rotmats[..., 1, 0], rotmats[..., 0, 0])
+
+    # X and Z rotate about the same axis, the Z rotation takes the whole angle
+    gimbal = np.abs(np.abs(rotmats[..., 2, 0]) - 1) < 1e-12
+    eulers[gimbal, 0] = 0.0
+    eulers[gimbal, 2] = np.arctan2(rotmats[gimbal][..., 0, 1], rotmats[gimbal][..., 1, 1])
+
+    return rad2deg(eulers) if use_deg else eulers
+
+
+def rotmat2expmap(rotmats):
+    '''
+    Exponential maps (..., 3) of rotation matrices (..., 3, 3), Rotation.to_expmap for all matrices at once
+
+    Small angles use the limit of the axis scaling (no division by sin(theta) = 0),
+    half turns take the axis from the symmetric part of the matrix
+    '''
+    rotmats = np.asarray(rotmats, dtype=float)
+    theta = np.arccos(np.clip((np.trace(rotmats, axis1=-2, axis2=-1) - 1) / 2, -1.0, 1.0))
+    axis = np.stack([rotmats[..., 2, 1] - rotmats[..., 1, 2],
+                     rotmats[..., 0, 2] - rotmats[..., 2, 0],
+                     rotmats[..., 1, 0] - rotmats[..., 0, 1]], axis=-1)
+
+    small = theta < 1e-6
+    half_turn = theta > math.pi - 1e-6
+    regular = ~(small | half_turn)
+    scale = np.empty(theta.shape)
+    # theta / (2 sin(theta)) -> 1/2 + theta^2/12 for small angles
+    scale[small] = 0.5 + theta[small] ** 2 / 12
+    scale[regular] = theta[regular] / (2 * np.sin(theta[regular]))
+    expmaps = scale[..., np.newaxis] * axis
+
+    if half_turn.any():
+        # (R + I) / 2 = a a^T at theta = pi, the column with the largest diagonal element is the most accurate
+        symmetric = (rotmats[half_turn] + np.eye(3)) / 2
+        column = np.argmax(np.diagonal(symmetric, axis1=-2, axis2=-1), axis=-1)
+        half_axis = symmetric[np.arange(column.size), :, column]
+        half_axis /= np.linalg.norm(half_axis, axis=-1, keepdims=True)
+        # same direction as the (inaccurate) antisymmetric part
+        sign = np.where(np.einsum('...i,...i', half_axis, axis[half_turn]) < 0, -1.0, 1.0)
+        expmaps[half_turn] = (sign * theta[half_turn])[..., np.newaxis] * half_axis
+    return expmaps
+
+
+def expmap2rotmat(expmaps):
+    '''Rotation matrices (..., 3, 3) of exponential maps (..., 3), Rotation(expmap, 'expmap').rotmat for all at once'''
+    expmaps = np.asarray(expmaps, dtype=float)
+    theta = np.linalg.norm(expmaps, axis=-1)
+    # zero rotation: any axis, the matrix is the identity
+    x, y, z = np.moveaxis(expmaps / np.where(theta > 0, theta, 1.0)[..., np.newaxis], -1, 0)
+    s = np.sin(theta / 2)
+    c = np.cos(theta / 2)
+
+    rotmats = np.empty(expmaps.shape[:-1] + (3, 3))
+    rotmats[..., 0, 0] = 2 * (x ** 2 - 1) * s ** 2 + 1
+    rotmats[..., 0, 1] = 2 * x * y * s ** 2 - 2 * z * c * s
+    rotmats[..., 0, 2] = 2 * x * z * s ** 2 + 2 * y * c * s
+    rotmats[..., 1, 0] = 2 * x * y * s ** 2 + 2 * z * c * s
+    rotmats[..., 1, 1] = 2 * (y ** 2 - 1) * s ** 2 + 1
+    rotmats[..., 1, 2] = 2 * y * z * s ** 2 - 2 * x * c * s
+    rotmats[..., 2, 0] = 2 * x * z * s ** 2 - 2 * y * c * s
+    rotmats[..., 2, 1] = 2 * y * z * s ** 2 + 2 * x * c * s
+    rotmats[..., 2, 2] = 2 * (z ** 2 - 1) * s ** 2 + 1
+    return rotmats
+
+
+
+def rotmat2quat(rotmats):
+    '''
+    Unit quaternions (..., 4) in w, x, y, z order of rotation matrices (..., 3, 3), w >= 0,
+    the same rotation as rotmat2expmap: (cos(theta/2), sin(theta/2) * axis)
+
+    Each quaternion is computed from the largest of 4w^2, 4x^2, 4y^2, 4z^2 (no division by a small component)
+    '''
+    rotmats = np.asarray(rotmats, dtype=float)
+    r = rotmats.reshape(-1, 9)
+    r00, r01, r02, r10, r11, r12, r20, r21, r22 = r.T
+    largest = np.argmax(np.stack([r00 + r11 + r22, r00, r11, r22], axis=-1), axis=-1)
+
+    quats = np.empty((r.shape[0], 4))
+    for component, (signs, w, x, y, z) in enumerate((
+            ((1, 1, 1), None, r21 - r12, r02 - r20, r10 - r01),
+            ((1, -1, -1), r21 - r12, None, r01 + r10, r02 + r20),
+            ((-1, 1, -1), r02 - r20, r01 + r10, None, r12 + r21),
+            ((-1, -1, 1), r10 - r01, r02 + r20, r12 + r21, None))):
+        rows = largest == component
+        if not rows.any():
+            continue
+        # 4 * largest component
+        s = 2 * np.sqrt(np.maximum(1 + signs[0] * r00[rows] + signs[1] * r11[rows] + signs[2] * r22[rows], 0.0))
+        for index, value in enumerate((w, x, y, z)):
+            quats[rows, index] = s / 4 if value is None else value[rows] / s
+
+    quats *= np.where(quats[:, :1] < 0, -1.0, 1.0)
+    quats /= np.linalg.norm(quats, axis=-1, keepdims=True)
+    return quats.reshape(rotmats.shape[:-2] + (4,))
+
+
+def quat2rotmat(quats):
+    '''Rotation matrices (..., 3, 3) of quaternions (..., 4) in w, x, y, z order, the inverse of rotmat2quat'''
+    quats = np.asarray(quats, dtype=float)
+    # not normalized quaternions (i.e. interpolated) are scaled to unit length
+    w, x, y, z = np.moveaxis(quats / np.linalg.norm(quats, axis=-1, keepdims=True), -1, 0)
+
+    rotmats = np.empty(quats.shape[:-1] + (3, 3))
+    rotmats[..., 0, 0] = 1 - 2 * (y * y + z * z)
+    rotmats[..., 0, 1] = 2 * (x * y - w * z)
+    rotmats[..., 0, 2] = 2 * (x * z + w * y)
+    rotmats[..., 1, 0] = 2 * (x * y + w * z)
+    rotmats[..., 1, 1] = 1 - 2 * (x * x + z * z)
+    rotmats[..., 1, 2] = 2 * (y * z - w * x)
+    rotmats[..., 2, 0] = 2 * (x * z - w * y)
+    rotmats[..., 2, 1] = 2 * (y * z + w * x)
+    rotmats[..., 2, 2] = 1 - 2 * (x * x + y * y)
+    return rotmats
+
 class Rotation():
     def __init__(self,rot, param_type, **params):
         self.rotmat = []
@@ -136,8 +287,7 @@ class Rotation():
         return eulers
     
     def to_quat(self):
-        #TODO
-        pass
+        return rotmat2quat(self.rotmat)
     
     def __str__(self):
         return "Rotation Matrix: \n " + self.rotmat.__str__()
@@ -1,16 +1,30 @@
+import json
+import os
+import struct
+import zlib
 import numpy as np
 import pandas as pd
+from data import MOCAP_MAGIC, MOCAP_VERSION, MOCAP_ALIGNMENT
 
 class BVHWriter():
-    def __init__(self):
-        pass
+    '''
+    Writes MocapData to a BVH file
+
+    precision: number of decimals of the motion values, None writes the shortest
+    representation that reads back exactly (like str)
+    chunk_frames: number of frames formatted at once, the memory used for formatting
+    does not depend on the number of frames
+    '''
+    def __init__(self, precision=None, chunk_frames=1024):
+        self.precision = precision
+        self.chunk_frames = chunk_frames
     
     def write(self, X, ofile):
         
         # Writing the skeleton info
         ofile.write('HIERARCHY\n')
         
-        self.motions_ = []
+        self.channels_ = []
         self._printJoint(X, X.root_name, 0, ofile)
 
         # Writing the motion header
@@ -18,10 +32,22 @@ class BVHWriter():
         ofile.write('Frames: %d\n'%X.values.shape[0])
         ofile.write('Frame Time: %f\n'%X.framerate)
 
-        # Writing the data
-        self.motions_ = np.asarray(self.motions_).T
-        lines = [" ".join(item) for item in self.motions_.astype(str)]
-        ofile.write("".join("%s\n"%l for l in lines))
+        # Writing the data, only a chunk of frames is copied and formatted at once
+        columns = X.values.columns.get_indexer(self.channels_)
+        if (columns < 0).any():
+            raise KeyError('Missing channels: %s'%', '.join(
+                channel for channel, column in zip(self.channels_, columns) if column < 0))
+        for start in range(0, X.values.shape[0], self.chunk_frames):
+            self._write_motion(X.values.iloc[start:start + self.chunk_frames, columns].to_numpy(), ofile)
+
+    def _write_motion(self, motions, ofile):
+        '''Writes the values (frames, channels) as lines of the motion section'''
+        if not motions.size:
+            return
+        value_format = '%r' if self.precision is None else '%.{}f'.format(self.precision)
+        line_format = ' '.join([value_format] * motions.shape[1]) + '\n'
+        # one format operation for all values of the chunk
+        ofile.write((line_format * motions.shape[0]) % tuple(motions.ravel().tolist()))
 
     def _printJoint(self, X, joint, tab, ofile):
         
@@ -43,7 +69,7 @@ class BVHWriter():
 
         if n_channels > 0:
             for ch in channels:
-                self.motions_.append(np.asarray(X.values['%s_%s'%(joint, ch)].values))
+                self.channels_.append('%s_%s'%(joint, ch))
 
         if len(X.skeleton[joint]['children']) > 0:
             ch_str = ''.join(' %s'*n_channels%tuple(channels))
@@ -53,3 +79,144 @@ class BVHWriter():
                 self._printJoint(X, c, tab+1, ofile)
 
         ofile.write('%s}\n'%('\t'*(tab)))
+
+
+class BVHStreamWriter(BVHWriter):
+    '''
+    Writes a BVH file incrementally: the hierarchy once (write_header), the motion in chunks of frames
+    (write_frames, in the order of X.channel_names) and the frame count when the file is closed
+    '''
+
+    # the frame count is written with a fixed width and patched on close
+    FRAMES_WIDTH = 10
+
+    def __init__(self, ofile, chunk_frames=256, precision=None):
+        super(BVHStreamWriter, self).__init__(precision=precision, chunk_frames=chunk_frames)
+        self.ofile = ofile
+        self.frames = 0
+        self._pending = []
+        self._pending_frames = 0
+        self._columns = None
+        self._frames_position = None
+
+    def write_header(self, X):
+        self.ofile.write('HIERARCHY\n')
+
+        self.channels_ = []
+        self._printJoint(X, X.root_name, 0, self.ofile)
+
+        # values arrive in the order of X.channel_names, the hierarchy defines the order in the file
+        channel_names = ['%s_%s'%(c[0], c[1]) for c in X.channel_names]
+        self._columns = [channel_names.index(c) for c in self.channels_]
+
+        self.ofile.write('MOTION\n')
+        self._frames_position = self.ofile.tell()
+        self.ofile.write('Frames: %s\n'%('0'.ljust(self.FRAMES_WIDTH)))
+        self.ofile.write('Frame Time: %f\n'%X.framerate)
+        self.ofile.flush()
+
+    def write_frames(self, values):
+        values = np.asarray(values)
+        if values.ndim == 1:
+            values = values[np.newaxis]
+        self._pending.append(values[:, self._columns])
+        self._pending_frames += values.shape[0]
+        if self._pending_frames >= self.chunk_frames:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        motions = np.concatenate(self._pending)
+        self._write_motion(motions, self.ofile)
+        self.ofile.flush()
+        self.frames += motions.shape[0]
+        self._pending = []
+        self._pending_frames = 0
+        # the file is complete after every chunk, i.e. after a crash
+        self._write_frame_count()
+
+    def _write_frame_count(self):
+        if self._frames_position is None:
+            return
+        self.ofile.seek(self._frames_position)
+        self.ofile.write('Frames: %s'%(str(self.frames).ljust(self.FRAMES_WIDTH)))
+        self.ofile.seek(0, os.SEEK_END)
+        self.ofile.flush()
+
+    def close(self):
+        self.flush()
+        self.ofile.close()
+
+
+class MocapFileWriter():
+    '''
+    Writes MocapData to a binary motion file (see data.MOCAP_MAGIC), parsers.MocapFileParser
+    loads it again without parsing text
+
+    dtype: type of the stored values, i.e. np.float32 halves the size
+    compression: None (the values can be memory-mapped when loading) or 'zlib'
+    level: zlib compression level
+    '''
+    def __init__(self, dtype=np.float64, compression=None, level=6):
+        if compression not in (None, 'zlib'):
+            raise ValueError('Unknown compression: {}'.format(compression))
+        self.dtype = np.dtype(dtype).newbyteorder('<')
+        self.compression = compression
+        self.level = level
+
+    def write(self, X, filename, metadata=None):
+        '''Writes skeleton, channels, framerate and values of X, metadata is stored in the header'''
+        values = X.values
+        time_index = isinstance(values.index, pd.TimedeltaIndex)
+        index_bytes = values.index.to_numpy().astype('timedelta64[ns]').astype('<i8').tobytes() if time_index else b''
+        value_bytes = np.ascontiguousarray(values.to_numpy(), dtype=self.dtype).tobytes()
+        if self.compression == 'zlib':
+            index_bytes = zlib.compress(index_bytes, self.level)
+            value_bytes = zlib.compress(value_bytes, self.level)
+
+        header = {'version': MOCAP_VERSION,
+                  'skeleton': X.skeleton,
+                  'channel_names': X.channel_names,
+                  'root_name': X.root_name,
+                  'framerate': X.framerate,
+                  'columns': [str(column) for column in values.columns],
+                  'frames': values.shape[0],
+                  'dtype': self.dtype.str,
+                  'compression': self.compression,
+                  'time_index': time_index,
+                  'index_size': len(index_bytes),
+                  'values_size': len(value_bytes),
+                  'metadata': metadata or {}}
+        # numpy numbers (i.e. offsets) are written as JSON numbers
+        header_bytes = json.dumps(header, default=lambda value: value.tolist()).encode('utf-8')
+        prefix_size = len(MOCAP_MAGIC) + 8
+        header_bytes += b' ' * (-(prefix_size + len(header_bytes)) % MOCAP_ALIGNMENT)
+
+        # written under a temporary name, the file is always complete
+        with open(filename + '.tmp', 'wb') as ofile:
+            ofile.write(MOCAP_MAGIC)
+            ofile.write(struct.pack('<Q', len(header_bytes)))
+            ofile.write(header_bytes)
+            ofile.write(index_bytes)
+            ofile.write(value_bytes)
+        os.replace(filename + '.tmp', filename)
+
+    @staticmethod
+    def update_metadata(filename, metadata):
+        '''
+        Replaces the metadata in the header of a motion file in place, index and values are not
+        rewritten (i.e. while memory-mapped). False if the new header does not fit into the old one
+        '''
+        with open(filename, 'r+b') as ofile:
+            if ofile.read(len(MOCAP_MAGIC)) != MOCAP_MAGIC:
+                raise ValueError('"{}" is not a motion file'.format(filename))
+            header_size, = struct.unpack('<Q', ofile.read(8))
+            header = json.loads(ofile.read(header_size).decode('utf-8'))
+            header['metadata'] = metadata
+            header_bytes = json.dumps(header).encode('utf-8')
+            if len(header_bytes) > header_size:
+                return False
+            ofile.seek(len(MOCAP_MAGIC) + 8)
+            ofile.write(header_bytes.ljust(header_size))
+        return True